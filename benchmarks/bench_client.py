@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: per-request latency of a bare requests.post versus the
+pooled keep-alive PathwayClient, against a local stub server.
+
+Usage:
+    python -m benchmarks.bench_client [--requests 500]
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+
+from benchmarks.stub_server import start_stub_server
+from src.client_functions.endpoints import PathwayClient
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50": samples[len(samples) // 2] * 1000,
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        "mean": statistics.fmean(samples) * 1000,
+    }
+
+
+def bench_bare(url, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        requests.post(url, json={"query": f"q{i}", "k": 3},
+                      headers={"accept": "*/*", "Content-Type": "application/json"}).json()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_pooled(client, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        client.retrieve(f"q{i}", k=3)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    server, port = start_stub_server()
+    try:
+        url = f"http://127.0.0.1:{port}/v1/retrieve"
+        client = PathwayClient("127.0.0.1", port)
+        # Warm up both paths once
+        bench_bare(url, 5)
+        bench_pooled(client, 5)
+
+        for name, samples in (("bare requests.post", bench_bare(url, args.requests)),
+                              ("pooled PathwayClient", bench_pooled(client, args.requests))):
+            p = _percentiles(samples)
+            print(f"{name:22s} p50={p['p50']:.3f}ms p99={p['p99']:.3f}ms mean={p['mean']:.3f}ms")
+        client.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
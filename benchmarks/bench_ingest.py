@@ -0,0 +1,81 @@
+"""
+Ingestion-lag benchmark: one text file per caption versus rotated JSONL segments.
+
+Writes N synthetic captions into the data directory watched by a running
+Pathway server (pathway/app.py) and polls /v1/statistics until every caption
+has been parsed. Both layouts add one parsed document per caption, so the
+document count tells how many captions are visible. Start with an empty
+data directory for clean numbers.
+
+Usage:
+    python -m benchmarks.bench_ingest --layout jsonl --captions 10000
+    python -m benchmarks.bench_ingest --layout files --captions 10000
+"""
+
+import argparse
+import os
+import time
+
+from src.client_functions.endpoints import PathwayClient, DEFAULT_HOST, DEFAULT_PORT
+from src.file.create import save_text_to_file, CaptionLog
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def synthetic_caption(i):
+    return (f"- *Event Time:* synthetic {i}\n"
+            f"- *Observed Change:* Clicking drawer {i % 97} revealed item {i}.\n"
+            f"- *Inferred Action:* The user searched drawer {i % 97}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layout", choices=("files", "jsonl"), default="jsonl")
+    parser.add_argument("--captions", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=0, help="captions per second (0 = as fast as possible)")
+    parser.add_argument("--data-dir", default=os.path.join(ROOT_DIR, "pathway", "data"))
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", default=DEFAULT_PORT)
+    parser.add_argument("--timeout", type=float, default=1800)
+    args = parser.parse_args()
+
+    client = PathwayClient(args.host, args.port)
+    baseline = client.statistics().get("file_count") or 0
+    caption_log = CaptionLog(args.data_dir) if args.layout == "jsonl" else None
+
+    written_at = []
+    start = time.perf_counter()
+    for i in range(args.captions):
+        text = synthetic_caption(i)
+        if caption_log is not None:
+            caption_log.append(text, click_coords=(i % 800, i % 600))
+        else:
+            save_text_to_file(text, args.data_dir)
+        written_at.append(time.perf_counter())
+        if args.rate:
+            time.sleep(max(0.0, start + (i + 1) / args.rate - time.perf_counter()))
+    write_seconds = time.perf_counter() - start
+    print(f"Wrote {args.captions} captions ({args.layout}) in {write_seconds:.1f}s")
+
+    lags = []
+    seen = 0
+    while seen < args.captions and time.perf_counter() - start < args.timeout:
+        count = (client.statistics().get("file_count") or 0) - baseline
+        now = time.perf_counter()
+        while seen < min(count, args.captions):
+            lags.append(now - written_at[seen])
+            seen += 1
+        time.sleep(0.2)
+
+    if not lags:
+        print("No captions became visible before the timeout.")
+        return
+    lags.sort()
+    print(f"Visible: {seen}/{args.captions}")
+    print(f"Lag p50={lags[len(lags) // 2]:.2f}s p99={lags[min(len(lags) - 1, int(len(lags) * 0.99))]:.2f}s "
+          f"max={lags[-1]:.2f}s")
+    print(f"Time until all visible: {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
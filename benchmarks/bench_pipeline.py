@@ -0,0 +1,353 @@
+"""
+End-to-end benchmark of the click and chat pipelines, fully offline.
+
+Runs the GameStreamApp click pipeline (enqueue_click_job -> ClickQueue ->
+click pool -> _process_next_click_job, with caption batching) and
+_process_chat_task headless (Qt offscreen platform, no window, no WebEngine
+page) against a fake Gemini client and the stub Pathway server, which serves
+the captions the pipeline writes as its index. Synthetic before/after frames
+are queued at increasing click rates. It reports:
+
+  - click latency (queued until the caption is written: queue wait, diff,
+    encode, caption call, caption write), p50/p99, and clicks dropped by
+    the queue policy
+  - click-to-indexed latency (click start until the caption is visible in
+    /v1/statistics), p50/p99
+  - ingestion lag seen by the client tracker (caption write until the
+    caption is listed by /v2/list_documents) and chat waits for fresh captions
+  - click throughput at each offered rate (with --screens N the clicks
+    repeat N transitions, so repeats are served by the caption memo)
+  - chat latency (and time to first streamed token), p50/p99
+
+Pass --host/--port to use a running Pathway server (pathway/app.py) instead of
+the stub; captions are then written to its data directory.
+
+Usage:
+    python -m benchmarks.bench_pipeline --rates 1 2 5 10 --clicks 40 --chats 20
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Must be set before Qt is loaded
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmarks.stub_server import start_stub_server
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CHAT_QUESTIONS = [
+    "What should I do next?",
+    "Where did I find the key?",
+    "What was the code on the note?",
+    "Why won't the red door open?",
+]
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"p50": float("nan"), "p99": float("nan")}
+    return {
+        "p50": samples[len(samples) // 2] * 1000,
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def synthetic_frames(i, width, height):
+    """A before/after QImage pair where a panel changes near the clicked spot."""
+    from PyQt5.QtGui import QImage, QColor, QPainter
+
+    before = QImage(width, height, QImage.Format_RGB32)
+    before.fill(QColor(30 + i % 50, 40, 60))
+    painter = QPainter(before)
+    for j in range(12):
+        painter.fillRect((j * 97 + i * 13) % (width - 80), (j * 53) % (height - 60), 80, 60,
+                         QColor((j * 40) % 255, (i * 7) % 255, 120))
+    painter.end()
+
+    after = before.copy()
+    click = ((i * 131) % (width - 200) + 100, (i * 71) % (height - 150) + 75)
+    painter = QPainter(after)
+    painter.fillRect(click[0] - 90, click[1] - 60, 180, 120, QColor(220, 200, 40))
+    painter.end()
+    return before, after, click
+
+
+def make_headless_app(main_module, work_dir):
+    """
+    Build an object carrying the GameStreamApp pipeline methods without
+    creating the window, so they can run without a display or WebEngine.
+    """
+    from functools import partial
+    from PyQt5.QtCore import QThreadPool
+
+    app_cls = main_module.GameStreamApp
+
+    class HeadlessApp:
+        enqueue_click_job = app_cls.enqueue_click_job
+        _process_next_click_job = app_cls._process_next_click_job
+        _prepare_caption_request = app_cls._prepare_caption_request
+        _caption_images = app_cls._caption_images
+        _encode = app_cls._encode
+        archive_screenshots = app_cls.archive_screenshots
+        _archive_click = app_cls._archive_click
+        remember_caption = app_cls.remember_caption
+        _process_chat_task = app_cls._process_chat_task
+        _prefetch_task = app_cls._prefetch_task
+        _chat_queries = app_cls._chat_queries
+        _retrieve_context = app_cls._retrieve_context
+        _current_index_version = app_cls._current_index_version
+
+        def __init__(self):
+            self.screenshots_dir = os.path.join(work_dir, "game_screenshots")
+            os.makedirs(self.screenshots_dir, exist_ok=True)
+            self.chat_index = main_module.ChatTurnIndex(partial(main_module.embed_texts, api_key=main_module.API))
+            self.caption_log = (main_module.CaptionLog(main_module.LIVE_DIR)
+                                if main_module.CAPTION_SINK == "jsonl" else None)
+            self.threadpool = QThreadPool()
+            self.pathway_async = main_module.BackgroundAsyncClient()
+            self.click_queue = main_module.ClickQueue(main_module.CLICK_QUEUE_SIZE, main_module.CLICK_QUEUE_POLICY)
+            self.click_pool = QThreadPool()
+            self.click_pool.setMaxThreadCount(main_module.CLICK_CONCURRENCY)
+            # perf_counter time each click's caption was written, by click key
+            self.written = {}
+            self.chat_prefetch = main_module.ChatPrefetch(min_similarity=main_module.PREFETCH_SIMILARITY)
+            self.caption_memo = (main_module.CaptionMemo(os.path.join(work_dir, "caption_memo.sqlite3"),
+                                                         max_distance=main_module.CAPTION_MEMO_MAX_DISTANCE,
+                                                         bucket_px=main_module.CAPTION_MEMO_BUCKET_PX)
+                                 if main_module.CAPTION_MEMO else None)
+            main_module.get_pathway_client().ingestion.add_listener(
+                lambda key, path, written, seen: main_module.spans.record("index_visible", key, written, seen))
+
+        def save_caption(self, caption, click_coords=None, hashes=None, timestamp=None, key=None):
+            file_path = app_cls.save_caption(self, caption, click_coords, hashes, timestamp, key)
+            self.written[key] = time.perf_counter()
+            return file_path
+
+        def on_click_processing_finished(self, results):
+            pass
+
+        def on_click_error(self, error_tuple):
+            print(f"Click worker failed: {error_tuple[1]}")
+
+        def log(self, msg):
+            pass
+
+    main_module.history.summarizer = partial(main_module.summarize_chat, api_key=main_module.API)
+    return HeadlessApp()
+
+
+class IndexWatcher(threading.Thread):
+    """Polls /v1/statistics and records when the document count went up."""
+
+    def __init__(self, client, interval=0.05):
+        super().__init__(daemon=True)
+        self.client = client
+        self.interval = interval
+        self.baseline = client.statistics().get("file_count") or 0
+        self.observed = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        last = self.baseline
+        while not self._stopped.is_set():
+            count = self.client.statistics().get("file_count") or 0
+            if count > last:
+                self.observed.append((time.perf_counter(), count - self.baseline))
+                last = count
+            time.sleep(self.interval)
+
+    def visible_at(self, n):
+        """perf_counter time at which at least n new documents were visible, or None."""
+        for at, count in self.observed:
+            if count >= n:
+                return at
+        return None
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def bench_clicks(app, client, main_module, rate, clicks, frame_size, index_timeout, screens=0, first_id=0):
+    """
+    Offer captured clicks to the app's click queue at `rate` per second, as
+    on_after_screenshot_captured does, and let the click pool caption them.
+    Clicks are numbered from first_id, and every click shows a new transition
+    unless screens > 0, in which case they cycle through that many.
+    """
+    watcher = IndexWatcher(client)
+    watcher.start()
+    ids = range(first_id, first_id + clicks)
+    frames = [synthetic_frames(i % screens if screens else i, *frame_size) for i in ids]
+    app.written.clear()
+    submitted = {}
+    dropped = 0
+
+    start = time.perf_counter()
+    for n, i in enumerate(ids):
+        time.sleep(max(0.0, start + n / rate - time.perf_counter()))
+        before, after, click = frames[n]
+        job = main_module.ClickJob(i, click)
+        job.before_image, job.after_image = before, after
+        job.before_at = job.after_at = time.time()
+        submitted[f"click-{i}"] = time.perf_counter()
+        dropped += len(app.enqueue_click_job(job))
+    app.click_pool.waitForDone()
+    elapsed = time.perf_counter() - start
+
+    # A coalesced job is written under the id of the click it was folded into
+    written = sorted((done, submitted[key]) for key, done in app.written.items())
+    latencies = [done - click_start for done, click_start in written]
+
+    deadline = time.perf_counter() + index_timeout
+    while watcher.visible_at(len(written)) is None and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    watcher.stop()
+
+    # The n-th caption written is the one that makes n documents visible
+    indexed = []
+    for n, (_, click_start) in enumerate(written, start=1):
+        at = watcher.visible_at(n)
+        if at is not None:
+            indexed.append(at - click_start)
+    return {
+        "throughput": len(written) / elapsed,
+        "click": _percentiles(latencies),
+        "indexed": _percentiles(indexed),
+        "indexed_count": len(indexed),
+        "written": len(written),
+        "dropped": dropped,
+    }
+
+
+def bench_chats(app, chats, frame_size, streaming, typing_time=0.0):
+    """With typing_time > 0 a prefetch of the message starts that long before it is sent."""
+    totals, first_tokens = [], []
+    for i in range(chats):
+        image = synthetic_frames(i, *frame_size)[1]
+        message = CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]
+        if typing_time > 0:
+            entry = app.chat_prefetch.start(message, app._chat_queries(message))
+            threading.Thread(target=app._prefetch_task, args=(entry, image), daemon=True).start()
+            time.sleep(typing_time)
+        first = []
+        callback = (lambda text: first.append(time.perf_counter()) if not first else None) if streaming else None
+        start = time.perf_counter()
+        app._process_chat_task(message, image, progress_callback=callback, key=f"chat-{i}")
+        totals.append(time.perf_counter() - start)
+        if first:
+            first_tokens.append(first[0] - start)
+    return {"chat": _percentiles(totals), "first_token": _percentiles(first_tokens)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 5, 10], help="offered clicks per second")
+    parser.add_argument("--clicks", type=int, default=30, help="clicks per rate")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--typing-time", type=float, default=0.0,
+                        help="prefetch each chat message this many seconds before sending it")
+    parser.add_argument("--screens", type=int, default=0,
+                        help="repeat this many distinct click transitions (0 = every click is new)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CLICK_CONCURRENCY", 2)))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("CAPTION_BATCH_SIZE", 1)),
+                        help="CAPTION_BATCH_SIZE of the click workers")
+    parser.add_argument("--queue-policy", choices=("drop-oldest", "coalesce", "block"),
+                        default=os.getenv("CLICK_QUEUE_POLICY", "drop-oldest"))
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[1280, 720])
+    parser.add_argument("--caption-latency", type=float, default=1.0, help="fake caption call (s)")
+    parser.add_argument("--answer-latency", type=float, default=1.5, help="fake answer call (s)")
+    parser.add_argument("--first-token-latency", type=float, default=0.4, help="fake stream start (s)")
+    parser.add_argument("--server-latency", type=float, default=0.005, help="stub server response (s)")
+    parser.add_argument("--index-lag", type=float, default=0.5, help="stub caption indexing delay (s)")
+    parser.add_argument("--index-timeout", type=float, default=30.0)
+    parser.add_argument("--sink", choices=("jsonl", "files"), default="jsonl")
+    parser.add_argument("--host", help="use a running Pathway server instead of the stub")
+    parser.add_argument("--port")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    server = None
+    if args.host:
+        host, port = args.host, args.port
+        data_dir = os.path.join(ROOT_DIR, "pathway", "data")
+    else:
+        data_dir = os.path.join(work_dir, "data")
+        os.makedirs(data_dir)
+        server, port = start_stub_server(latency=args.server_latency, data_dir=data_dir,
+                                         index_lag=args.index_lag)
+        host = "127.0.0.1"
+
+    # src.main reads its configuration from the environment on import
+    os.environ["PATHWAY_HOST"] = str(host)
+    os.environ["PATHWAY_PORT"] = str(port)
+    os.environ["CAPTION_SINK"] = args.sink
+    os.environ["CLICK_CONCURRENCY"] = str(args.concurrency)
+    os.environ["CAPTION_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["CLICK_QUEUE_POLICY"] = args.queue_policy
+
+    from PyQt5.QtWidgets import QApplication
+    from src import main as main_module
+    from src.client_functions.endpoints import PathwayClient
+    from benchmarks.fake_gemini import install_fake_gemini
+
+    qt_app = QApplication([])
+    main_module.LIVE_DIR = data_dir
+    fake = install_fake_gemini(main_module.API, caption_latency=args.caption_latency,
+                               answer_latency=args.answer_latency,
+                               first_token_latency=args.first_token_latency)
+    app = make_headless_app(main_module, work_dir)
+    client = PathwayClient(host, port)
+
+    try:
+        print(f"Fake Gemini: caption {args.caption_latency}s, answer {args.answer_latency}s; "
+              f"{'stub server, index lag ' + str(args.index_lag) + 's' if server else f'Pathway at {host}:{port}'}; "
+              f"concurrency {args.concurrency}, batch {args.batch_size}, {args.queue_policy}, sink {args.sink}")
+        print(f"{'rate/s':>7} {'done/s':>7} {'click p50':>10} {'click p99':>10} "
+              f"{'indexed p50':>12} {'indexed p99':>12} {'indexed':>8} {'dropped':>8}")
+        for n, rate in enumerate(args.rates):
+            r = bench_clicks(app, client, main_module, rate, args.clicks, args.frame_size,
+                             args.index_timeout, args.screens, first_id=n * args.clicks)
+            print(f"{rate:7.1f} {r['throughput']:7.2f} {r['click']['p50']:8.0f}ms {r['click']['p99']:8.0f}ms "
+                  f"{r['indexed']['p50']:10.0f}ms {r['indexed']['p99']:10.0f}ms "
+                  f"{r['indexed_count']:>4}/{r['written']:<3} {r['dropped']:>8}")
+
+        if args.chats:
+            streaming = main_module.CHAT_STREAMING
+            r = bench_chats(app, args.chats, args.frame_size, streaming, args.typing_time)
+            line = f"Chat ({args.chats} messages): p50={r['chat']['p50']:.0f}ms p99={r['chat']['p99']:.0f}ms"
+            if streaming:
+                line += (f", first token p50={r['first_token']['p50']:.0f}ms "
+                         f"p99={r['first_token']['p99']:.0f}ms")
+            print(line)
+        app.threadpool.waitForDone()
+        print(f"Model calls: {dict(fake.models.calls)}")
+        if app.caption_memo is not None:
+            memo = app.caption_memo.stats()
+            print(f"Caption memo: {memo['hits']} hits / {memo['misses']} misses ({memo['hit_rate']:.0%}), "
+                  f"{memo['entries']} entries")
+        ingestion = main_module.ingestion_stats()
+        print(f"Ingestion: {ingestion['visible']}/{ingestion['tracked']} captions seen in list_documents "
+              f"after {ingestion['polls']} polls, lag p50={ingestion['lag']['p50'] * 1000:.0f}ms "
+              f"p99={ingestion['lag']['p99'] * 1000:.0f}ms, "
+              f"{ingestion['fresh_waits']} chat waits ({ingestion['fresh_timeouts']} timed out)")
+        print("Stage timings:")
+        for stage, stats in main_module.spans.summary().items():
+            print(f"  {stage:20s} n={stats['count']:<4} p50={stats['p50'] * 1000:8.1f}ms "
+                  f"p99={stats['p99'] * 1000:8.1f}ms")
+    finally:
+        client.close()
+        app.pathway_async.close()
+        if server is not None:
+            server.shutdown()
+        qt_app.quit()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+USearch HNSW benchmark: insert throughput, query latency, memory and recall@k
+against brute-force cosine search, on synthetic clustered embeddings.
+
+Mirrors the index built by pathway/app.py (cosine metric, streaming inserts
+in small batches into an index that grows as needed), so the USEARCH_*
+settings can be tuned before changing the server configuration.
+Requires the `usearch` package (pip install usearch), which is not part of
+either requirements file.
+
+Usage:
+    python -m benchmarks.bench_usearch --sizes 1000 10000 100000 --dim 768
+    python -m benchmarks.bench_usearch --connectivity 32 --expansion-search 128
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+try:
+    from usearch.index import Index
+except ImportError:
+    sys.exit("bench_usearch needs the usearch package: pip install usearch")
+
+
+def synthetic_embeddings(n, dim, clusters=64, seed=0):
+    """Unit vectors drawn around random cluster centres (closer to real text embeddings than pure noise)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_size(n, args):
+    vectors = synthetic_embeddings(n, args.dim, seed=n)
+    queries = synthetic_embeddings(args.queries, args.dim, seed=n + 1)
+
+    index = Index(
+        ndim=args.dim,
+        metric="cos",
+        connectivity=args.connectivity or None,
+        expansion_add=args.expansion_add or None,
+        expansion_search=args.expansion_search or None,
+    )
+
+    keys = np.arange(n, dtype=np.uint64)
+    start = time.perf_counter()
+    for lo in range(0, n, args.batch):
+        index.add(keys[lo:lo + args.batch], vectors[lo:lo + args.batch])
+    insert_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for query in queries:
+        t = time.perf_counter()
+        matches = index.search(query, args.k)
+        latencies.append(time.perf_counter() - t)
+        found.append(set(int(key) for key in matches.keys))
+
+    # Brute force ground truth (vectors are normalised, so dot product == cosine)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+    recall = np.mean([len(found[i] & set(truth[i].tolist())) / args.k for i in range(len(queries))])
+
+    latencies.sort()
+    return {
+        "n": n,
+        "insert_per_s": n / insert_seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "memory_mb": index.memory_usage / 2 ** 20,
+        "recall": recall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=768, help="text-embedding-004 produces 768 dimensions")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=64, help="vectors per add() call, like streaming minibatches")
+    parser.add_argument("--connectivity", type=int, default=0, help="0 = library default")
+    parser.add_argument("--expansion-add", type=int, default=0, help="0 = library default")
+    parser.add_argument("--expansion-search", type=int, default=0, help="0 = library default")
+    args = parser.parse_args()
+
+    print(f"{'n':>8} {'insert/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'mem MB':>8} {'recall@' + str(args.k):>10}")
+    for n in args.sizes:
+        r = bench_size(n, args)
+        print(f"{r['n']:>8} {r['insert_per_s']:>10.0f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+              f"{r['memory_mb']:>8.1f} {r['recall']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Offline stand-in for the google-genai client used by src/agent/agent_utils.py.
+
+Answers generate_content / generate_content_stream / embed_content with canned
+text after a configurable latency, so the click and chat pipelines can be
+timed without network access or API quota. Install it with install_fake_gemini().
+"""
+
+import hashlib
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from src.agent import agent_utils
+
+CANNED_CAPTIONS = [
+    "- *Event Time:* {time}\n- *Observed Change:* A drawer opened and revealed a brass key.\n"
+    "- *Inferred Action:* The user searched the desk drawer.",
+    "- *Event Time:* {time}\n- *Observed Change:* A note with the code 4-7-1 appeared on screen.\n"
+    "- *Inferred Action:* The user read the note on the wall.",
+    "- *Event Time:* {time}\n- *Observed Change:* The red door stayed closed and a lock icon flashed.\n"
+    "- *Inferred Action:* The user tried to open the locked red door.",
+]
+CANNED_ANSWER = ("You already found a brass key in the desk drawer. Try it on the red door, "
+                 "then enter the code 4-7-1 from the note on the keypad behind it.")
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Embedding:
+    def __init__(self, values):
+        self.values = values
+
+
+class _EmbedResponse:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+class FakeModels:
+    """The ``client.models`` part of genai.Client."""
+
+    def __init__(self, caption_latency=1.0, answer_latency=1.5, first_token_latency=0.4,
+                 stream_chunks=8, embed_latency=0.05, embed_dim=64, captions=None, answer=None):
+        self.caption_latency = caption_latency
+        self.answer_latency = answer_latency
+        self.first_token_latency = first_token_latency
+        self.stream_chunks = stream_chunks
+        self.embed_latency = embed_latency
+        self.embed_dim = embed_dim
+        self.captions = itertools.cycle(captions or CANNED_CAPTIONS)
+        self.answer = answer or CANNED_ANSWER
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _next_caption(self, event_time):
+        with self._lock:
+            return next(self.captions).format(time=event_time)
+
+    def _count(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def generate_content(self, model, contents):
+        prompt = contents[-1] if isinstance(contents[-1], str) else ""
+        times = re.findall(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", prompt)
+        if "### Click" in prompt:
+            self._count("caption_batch")
+            time.sleep(self.caption_latency)
+            clicks = sorted(set(int(n) for n in re.findall(r"### Click (\d+)", prompt)))
+            return _Response("\n".join(f"### Click {n}\n{self._next_caption(times[0] if times else '')}"
+                                       for n in clicks))
+        if "pairs of screenshots" in prompt:
+            self._count("caption")
+            time.sleep(self.caption_latency)
+            return _Response(self._next_caption(times[0] if times else ""))
+        if "running summary" in prompt:
+            self._count("summary")
+            time.sleep(self.answer_latency)
+            return _Response("The user found a brass key and the code 4-7-1.")
+        self._count("answer")
+        time.sleep(self.answer_latency)
+        return _Response(self.answer)
+
+    def generate_content_stream(self, model, contents):
+        self._count("answer_stream")
+        words = self.answer.split(" ")
+        step = max(1, len(words) // self.stream_chunks)
+        rest = max(0.0, self.answer_latency - self.first_token_latency)
+        time.sleep(self.first_token_latency)
+        for i in range(0, len(words), step):
+            if i:
+                time.sleep(rest * step / len(words))
+            yield _Response(" ".join(words[i:i + step]) + " ")
+
+    def embed_content(self, model, contents):
+        self._count("embed")
+        time.sleep(self.embed_latency)
+        embeddings = []
+        for text in contents:
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+            embeddings.append(_Embedding(np.random.default_rng(seed).standard_normal(self.embed_dim).tolist()))
+        return _EmbedResponse(embeddings)
+
+
+class FakeGeminiClient:
+    """Drop-in for genai.Client with only the ``models`` API the app uses."""
+
+    def __init__(self, **kwargs):
+        self.models = FakeModels(**kwargs)
+
+
+def install_fake_gemini(api_key, **kwargs):
+    """
+    Register a FakeGeminiClient as the shared client for api_key, so every
+    agent_utils call made with that key is answered offline.
+
+    Returns:
+        The installed FakeGeminiClient
+    """
+    client = FakeGeminiClient(**kwargs)
+    with agent_utils._clients_lock:
+        agent_utils._clients[api_key] = client
+    return client
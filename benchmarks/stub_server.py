@@ -0,0 +1,135 @@
+"""
+Minimal local stand-in for the Pathway REST server.
+Answers the endpoints used by src/client_functions/endpoints.py with canned JSON.
+
+With a data directory it also imitates the indexer: caption files
+(text_*.txt and captions_*.jsonl rows) become visible index_lag seconds after
+the stub first sees them, and statistics, list_documents and retrieve
+report only visible captions.
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubIndex:
+    """Documents found in a caption directory, with the time each one became visible."""
+
+    def __init__(self, data_dir, index_lag=0.0):
+        self.data_dir = data_dir
+        self.index_lag = index_lag
+        self._lock = threading.Lock()
+        self._offsets = {}
+        # (first_seen, text, metadata) in discovery order
+        self._docs = []
+
+    def _scan(self):
+        now = time.time()
+        for name in sorted(os.listdir(self.data_dir)):
+            path = os.path.join(self.data_dir, name)
+            offset = self._offsets.get(path, 0)
+            size = os.path.getsize(path)
+            if size <= offset:
+                continue
+            if name.endswith(".jsonl"):
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+                # Only complete lines; a partly written one is picked up next time
+                chunk = chunk[:chunk.rfind(b"\n") + 1]
+                for line in chunk.splitlines():
+                    record = json.loads(line)
+                    self._docs.append((now, record["caption"],
+                                       {"path": path, "event_ts": record.get("timestamp"),
+                                        "caption_id": record.get("caption_id"), "seen_at": now}))
+                self._offsets[path] = offset + len(chunk)
+            elif name.endswith(".txt"):
+                with open(path, encoding="utf-8") as f:
+                    text = f.read()
+                self._docs.append((now, text, {"path": path, "event_ts": os.path.getmtime(path), "seen_at": now}))
+                self._offsets[path] = size
+
+    def visible(self):
+        """Return (first_seen, text, metadata) of every document already indexed."""
+        with self._lock:
+            self._scan()
+            cutoff = time.time() - self.index_lag
+            return [doc for doc in self._docs if doc[0] <= cutoff]
+
+
+class StubPathwayHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep the connection alive
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"null")
+        delay = self.server.latency
+        if delay:
+            time.sleep(delay)
+        index = self.server.index
+        docs = index.visible() if index is not None else None
+
+        if self.path == "/v1/retrieve":
+            k = (body or {}).get("k", 3)
+            if docs is None:
+                payload = [
+                    {"text": f"stub chunk {i}", "dist": 0.1 * i,
+                     "metadata": {"path": f"data/stub_{i}.txt"}}
+                    for i in range(k)
+                ]
+            else:
+                # No embeddings here: the newest captions are the nearest ones
+                payload = [{"text": text, "dist": 0.1 * i, "metadata": metadata}
+                           for i, (_, text, metadata) in enumerate(reversed(docs[-k:]))]
+        elif self.path == "/v1/statistics":
+            if docs:
+                payload = {"file_count": len(docs),
+                           "last_modified": max(metadata["event_ts"] or 0 for _, _, metadata in docs),
+                           "last_indexed": docs[-1][0]}
+            else:
+                payload = {"file_count": 0, "last_modified": None, "last_indexed": None}
+        elif self.path == "/v2/list_documents":
+            payload = [metadata for _, _, metadata in docs or []]
+        elif self.path == "/v2/answer":
+            payload = {"response": "stub answer"}
+        elif self.path == "/v2/summarize":
+            payload = {"summary": "stub summary"}
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, data_dir=None, index_lag=0.0):
+    """
+    Start the stub server on a background thread.
+
+    Args:
+        latency: Seconds added to every response
+        data_dir: Optional caption directory to serve as the index
+        index_lag: Seconds before a new caption in data_dir becomes visible
+
+    Returns:
+        (server, port) - call server.shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), StubPathwayHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.index = StubIndex(data_dir, index_lag) if data_dir else None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
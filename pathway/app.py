@@ -6,9 +6,12 @@ from pathway.udfs import DefaultCache
 from pathway.udfs import ExponentialBackoffRetryStrategy
 from pathway.xpacks.llm.question_answering import BaseRAGQuestionAnswerer
 from pathway.stdlib.indexing import UsearchKnnFactory, USearchMetricKind
-from pathway.xpacks.llm import embedders, llms, parsers, splitters
+from pathway.xpacks.llm import embedders, llms, splitters
 from pathway.xpacks.llm.document_store import DocumentStore
 
+from parsing import RoutingParser
+from local_embedder import HashingEmbedder
+
 pw.set_license_key("demo-license-key-with-telemetry")
 
 logging.basicConfig(
@@ -19,26 +22,150 @@ logging.basicConfig(
 
 load_dotenv()
 
-def run():
-    folder = pw.io.fs.read(
-        path="./data",
-        format="binary",
-        with_metadata=True,
+
+class CaptionSchema(pw.Schema):
+    """One line of a captions_*.jsonl segment written by src/file/create.py:CaptionLog."""
+    caption: str
+    timestamp: float
+    session_id: str | None = pw.column_definition(default_value=None)
+    click_x: int | None = pw.column_definition(default_value=None)
+    click_y: int | None = pw.column_definition(default_value=None)
+    before_hash: str | None = pw.column_definition(default_value=None)
+    after_hash: str | None = pw.column_definition(default_value=None)
+    caption_id: str | None = pw.column_definition(default_value=None)
+
+
+@pw.udf
+def caption_bytes(caption: str) -> bytes:
+    # Same column type as the binary file source, so both can feed one DocumentStore
+    return caption.encode("utf-8")
+
+
+@pw.udf
+def caption_metadata(metadata: pw.Json, timestamp: float, session_id: str | None,
+                     click_x: int | None, click_y: int | None,
+                     before_hash: str | None, after_hash: str | None,
+                     caption_id: str | None) -> pw.Json:
+    meta = metadata.as_dict()
+    meta.update(
+        event_ts=timestamp,
+        session_id=session_id,
+        click_x=click_x,
+        click_y=click_y,
+        before_hash=before_hash,
+        after_hash=after_hash,
+        caption_id=caption_id,
     )
+    return pw.Json(meta)
+
+
+@pw.udf
+def file_event_metadata(metadata: pw.Json) -> pw.Json:
+    # One caption per text_*.txt file: its creation time is the event time
+    meta = metadata.as_dict()
+    event_ts = meta.get("created_at") or meta.get("modified_at")
+    if event_ts is not None:
+        meta["event_ts"] = float(event_ts)
+    return pw.Json(meta)
+
 
-    sources = [folder]
+def read_caption_segments(path, mode="streaming"):
+    """Read JSONL caption segments as one document row per caption."""
+    rows = pw.io.jsonlines.read(
+        os.path.join(path, "*.jsonl"),
+        schema=CaptionSchema,
+        mode=mode,
+        with_metadata=True,
+    )
+    return rows.select(
+        data=caption_bytes(pw.this.caption),
+        _metadata=caption_metadata(
+            pw.this._metadata, pw.this.timestamp, pw.this.session_id,
+            pw.this.click_x, pw.this.click_y, pw.this.before_hash, pw.this.after_hash,
+            pw.this.caption_id,
+        ),
+    )
 
-    # Use ParseUnstructured for text files
-    parser = parsers.ParseUnstructured()
 
-    text_splitter = splitters.TokenCountSplitter(max_tokens=800)
+def initial_index_capacity(data_dir, minimum=1000, headroom=2.0):
+    """
+    Size the index for the captions already on disk so that restarts of a
+    long session do not start from a tiny index and regrow it step by step.
+    One caption is roughly one chunk (captions are far below max_tokens).
+    """
+    documents = 0
+    for root, _, files in os.walk(data_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(".jsonl"):
+                with open(path, "rb") as f:
+                    documents += sum(1 for _ in f)
+            else:
+                documents += 1
+    return max(minimum, int(documents * headroom))
+
+
+def usearch_settings(data_dir):
+    """HNSW settings from the environment. 0 keeps the USearch default."""
+    reserved_space = os.environ.get("USEARCH_RESERVED_SPACE", "auto")
+    return dict(
+        reserved_space=(initial_index_capacity(data_dir) if reserved_space == "auto"
+                        else int(reserved_space)),
+        connectivity=int(os.environ.get("USEARCH_CONNECTIVITY", 0)),
+        expansion_add=int(os.environ.get("USEARCH_EXPANSION_ADD", 0)),
+        expansion_search=int(os.environ.get("USEARCH_EXPANSION_SEARCH", 0)),
+    )
 
-    embedder = embedders.GeminiEmbedder(model="models/text-embedding-004")
 
+def run():
+    folder = pw.io.fs.read(
+        path="./data",
+        format="binary",
+        with_metadata=True,
+    )
+    # Caption segments are ingested row by row below, not as whole files
+    folder = folder.filter(~pw.this._metadata["path"].as_str(default="").str.endswith(".jsonl"))
+    # Every document carries a numeric event_ts, so clients can filter and
+    # re-rank by event time through metadata_filter
+    folder = folder.with_columns(_metadata=file_event_metadata(pw.this._metadata))
+
+    captions = read_caption_segments("./data")
+
+    sources = [folder, captions]
+
+    # Plain UTF-8 documents (our captions) are decoded directly,
+    # only PDF/Office/HTML documents go through ParseUnstructured
+    parser = RoutingParser()
+
+    embedder_name = os.environ.get("EMBEDDER", "gemini")
+    # TokenCountSplitter downloads its tiktoken encoding on first use (unless
+    # it is already in TIKTOKEN_CACHE_DIR). SPLITTER=none indexes every
+    # document as one chunk, which is fine for captions and needs no network;
+    # it is the default with the offline embedder.
+    splitter_name = os.environ.get("SPLITTER", "none" if embedder_name == "hashing" else "tokens")
+    if splitter_name == "none":
+        text_splitter = splitters.NullSplitter()
+    else:
+        text_splitter = splitters.TokenCountSplitter(max_tokens=800)
+
+    # EMBEDDER=hashing embeds on the CPU without an API key or weights;
+    # /v2/answer still calls the Gemini LLM
+    if embedder_name == "hashing":
+        embedder = HashingEmbedder(
+            dimensions=int(os.environ.get("LOCAL_EMBEDDER_DIM", 1024)),
+            batch_size=int(os.environ.get("LOCAL_EMBEDDER_BATCH", 256)),
+        )
+    else:
+        embedder = embedders.GeminiEmbedder(model="models/text-embedding-004")
+
+    # The index grows past reserved_space on its own; see
+    # benchmarks/bench_usearch.py for the recall/latency trade-offs.
+    index_settings = usearch_settings("./data")
+    logging.info("USearch index settings: %s", index_settings)
     index = UsearchKnnFactory(
-        reserved_space=1000,
         embedder=embedder,
-        metric=USearchMetricKind.COS
+        metric=USearchMetricKind.COS,
+        **index_settings
     )
 
     llm = llms.LiteLLMChat(
@@ -0,0 +1,49 @@
+import re
+import zlib
+
+import numpy as np
+from pathway.xpacks.llm import embedders
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder(embedders.BaseEmbedder):
+    """
+    CPU-only embedder that needs no network and no downloaded weights.
+
+    Texts are turned into signed feature-hashed bags of word unigrams and
+    bigrams with sublinear term frequency, then L2-normalised, so cosine
+    similarity behaves like TF cosine over the hashed vocabulary. Hashing uses
+    crc32, which is stable across processes, so cached embeddings stay valid
+    after a restart. Many chunks are embedded per call (`batch_size`).
+    """
+
+    def __init__(self, dimensions: int = 1024, batch_size: int = 256):
+        super().__init__(max_batch_size=batch_size)
+        self.dimensions = dimensions
+
+    def get_embedding_dimension(self, **kwargs):
+        return self.dimensions
+
+    def _features(self, text: str):
+        tokens = TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return [zlib.crc32(feature.encode("utf-8")) for feature in features]
+
+    def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+        rows, hashes = [], []
+        for row, text in enumerate(input):
+            h = self._features(text)
+            rows.extend([row] * len(h))
+            hashes.extend(h)
+
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        columns = (hashes % self.dimensions).astype(np.int64)
+        signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0)
+
+        counts = np.zeros((len(input), self.dimensions), dtype=np.float32)
+        np.add.at(counts, (np.asarray(rows, dtype=np.int64), columns), signs)
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+        return list(vectors)
@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+import pathway as pw
+from pathway.xpacks.llm import parsers
+
+logger = logging.getLogger(__name__)
+
+# File signatures of rich documents that need a real document parser
+RICH_SIGNATURES = (
+    b"%PDF-",                       # PDF
+    b"PK\x03\x04",                  # DOCX / PPTX / XLSX (zip containers)
+    b"\xd0\xcf\x11\xe0",            # legacy DOC / PPT / XLS
+    b"{\\rtf",                      # RTF
+)
+HTML_MARKERS = (b"<!doctype html", b"<html")
+
+
+def is_rich_document(contents: bytes) -> bool:
+    """True for PDF/Office/RTF/HTML content, False for plain text."""
+    if contents.startswith(RICH_SIGNATURES):
+        return True
+    head = contents[:512].lstrip().lower()
+    return head.startswith(HTML_MARKERS)
+
+
+class RoutingParser(pw.UDF):
+    """
+    Parser that decodes plain UTF-8 documents directly and sends only rich
+    documents (PDF, Office, RTF, HTML) through ParseUnstructured.
+
+    Parser UDFs only see the document contents, not its path, so the route is
+    chosen from the content's file signature. Caption files (.txt) and JSONL
+    caption rows take the fast path. The unstructured parser is only created
+    when the first rich document arrives.
+
+    Per-route document counts and parse times are logged every
+    `report_every` documents and are available from stats().
+    """
+
+    def __init__(self, report_every: int = 100, **kwargs):
+        super().__init__(**kwargs)
+        self.report_every = report_every
+        self._rich = None
+        self._lock = threading.Lock()
+        self._stats = {"utf8": [0, 0.0], "unstructured": [0, 0.0]}
+        self._total = 0
+
+    async def __wrapped__(self, contents: bytes | str) -> list[tuple[str, dict]]:
+        start = time.perf_counter()
+        if isinstance(contents, str):
+            route, docs = "utf8", [(contents, {})]
+        elif not is_rich_document(contents):
+            try:
+                route, docs = "utf8", [(contents.decode("utf-8"), {})]
+            except UnicodeDecodeError:
+                route, docs = "unstructured", await self._parse_rich(contents)
+        else:
+            route, docs = "unstructured", await self._parse_rich(contents)
+        self._record(route, time.perf_counter() - start)
+        return docs
+
+    async def _parse_rich(self, contents: bytes):
+        if self._rich is None:
+            self._rich = parsers.ParseUnstructured()
+        return await self._rich.__wrapped__(contents)
+
+    def _record(self, route, seconds):
+        with self._lock:
+            self._stats[route][0] += 1
+            self._stats[route][1] += seconds
+            self._total += 1
+            report = self._total % self.report_every == 0
+        if report:
+            logger.info("Parser stats: %s", self.stats())
+
+    def stats(self):
+        """{route: {"documents": n, "parse_seconds": total, "avg_ms": mean}}"""
+        with self._lock:
+            return {
+                route: {
+                    "documents": count,
+                    "parse_seconds": round(seconds, 4),
+                    "avg_ms": round(seconds / count * 1000, 3) if count else 0.0,
+                }
+                for route, (count, seconds) in self._stats.items()
+            }
@@ -1,22 +1,13 @@
+import re
+import threading
 from datetime import datetime
 from google import genai
 from google.genai import types
 
-def screenshot_to_text(images_list, api_key):
-    """
-    Input: List of image paths (from local storage)
-           Assuming only 2 images in images_list [before_click, after_click]
-    Output: Detailed textual description of changes and extracted clues
-    """
-    event_time = datetime.now()
-    formatted_time = event_time.strftime('%Y-%m-%d %H:%M:%S')
-    system_prompt = f"""
-    You are an AI assistant specialized in analyzing pairs of screenshots. 
-    The event you are analyzing occurred at exactly: {formatted_time}.
-    The user will provide two images: 
-    - Image 1: before a mouse click
-    - Image 2: after the mouse click
+GEMINI_MODEL = "gemini-2.5-flash"
+EMBEDDING_MODEL = "text-embedding-004"
 
+CAPTION_TASKS = """
     Your tasks:
     1. **Provide a detailed semantic description of the scene**:  
     - Describe what is visible: objects, symbols, patterns, shapes, text, numbers, icons, or decorative elements.  
@@ -31,51 +22,164 @@ def screenshot_to_text(images_list, api_key):
     3. **Clue or relevance analysis**:  
     - For each described element, suggest how or why it might be relevant to the application’s context (e.g., puzzle-solving, navigation, progress tracking).  
     - Do not assume the application type; keep the explanation general.
+"""
 
-    Format your response, making sure to include the event time:
+CAPTION_FORMAT = """
     - *Event Time:* {formatted_time}
     - *Observed Change:* (A concise, one-sentence summary of the click's result.)
     - *Detailed Description:* (A thorough list of all visual differences.)
     - *State Elements & Notable Objects:* (Description of important persistent items.)
     - *Inferred Action:* (A brief interpretation of the user's action.)
-    """
+"""
 
-    image_before_path = images_list[0]
-    image_after_path = images_list[1]
+# The model sometimes bolds the label, so the asterisks are optional
+EVENT_TIME_PATTERN = re.compile(r"(\**Event Time:\**\s*)[^\n]*")
 
-    # Read image bytes
-    with open(image_before_path, "rb") as f:
-        image1_bytes = f.read()
-    with open(image_after_path, "rb") as f:
-        image2_bytes = f.read()
+# ---------------------------
+# Shared Gemini client
+# ---------------------------
+_clients = {}
+_clients_lock = threading.Lock()
 
-    client = genai.Client(api_key=api_key)
+def get_client(api_key):
+    """Return the process-wide genai.Client for api_key, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = genai.Client(api_key=api_key)
+            _clients[api_key] = client
+        return client
+
+
+def _image_part(image):
+    """Build a Gemini image part from encoded (bytes, mime_type) or a PNG file path."""
+    if isinstance(image, tuple):
+        data, mime_type = image
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+    with open(image, "rb") as f:
+        return types.Part.from_bytes(data=f.read(), mime_type="image/png")
+
+
+def _focus_note(focus, images_list, crops="Images 1 and 2", thumbnail="Image 3"):
+    """Prompt lines explaining cropped images and the optional thumbnail."""
+    note = ""
+    if focus:
+        x0, y0, x1, y1 = focus["region"]
+        note += f"""
+    Note: {crops} are crops of the window region ({x0}, {y0}) - ({x1}, {y1}) around the click"""
+        if focus.get("click"):
+            note += f""" at ({focus['click'][0]:.0f}, {focus['click'][1]:.0f})"""
+        note += "."
+    if len(images_list) > 2:
+        note += f"""
+    {thumbnail} is a low-resolution thumbnail of the whole window after the click, for overall context."""
+    return note
+
+
+def screenshot_to_text(images_list, api_key, focus=None, event_time=None):
+    """
+    Input: List of images, each encoded (bytes, mime_type) or an image path
+           [before_click, after_click] and optionally a third low-resolution
+           thumbnail of the full window
+           focus: optional dict with "region" (x0, y0, x1, y1) and "click" (x, y)
+           when the before/after images are crops of the window
+           event_time: datetime of the click (default: now)
+    Output: Detailed textual description of changes and extracted clues
+    """
+    event_time = event_time or datetime.now()
+    formatted_time = event_time.strftime('%Y-%m-%d %H:%M:%S')
+    system_prompt = f"""
+    You are an AI assistant specialized in analyzing pairs of screenshots. 
+    The event you are analyzing occurred at exactly: {formatted_time}.
+    The user will provide two images: 
+    - Image 1: before a mouse click
+    - Image 2: after the mouse click
+{CAPTION_TASKS}
+    Format your response, making sure to include the event time:{CAPTION_FORMAT.format(formatted_time=formatted_time)}"""
+    system_prompt += _focus_note(focus, images_list)
+
+    image_parts = [_image_part(image) for image in images_list]
+
+    client = get_client(api_key)
 
     response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[
-            types.Part.from_bytes(data=image1_bytes, mime_type="image/png"),
-            types.Part.from_bytes(data=image2_bytes, mime_type="image/png"),
-            system_prompt.strip(),
-        ]
+        model=GEMINI_MODEL,
+        contents=image_parts + [system_prompt.strip()]
     )
 
     return response.text
 
 
-def get_user_response(user_query, relevant_chat, current_screenshot, chunks, api_key):
+def screenshots_to_text_batch(clicks, api_key):
     """
-    Inputs: 
-    1. user_query: string
-    2. relevant_chat: string
-    3. current_screenshot: string (image_path from local storage)
-    4. chunks: list of relevant texts
+    Caption several clicks with a single multi-image request.
 
-    Output: 
-    Response: string
+    Input: clicks: list of dicts with "images" (as for screenshot_to_text) and
+           optional "focus" and "event_time"
+    Output: list of captions, one per click, in the same order.
+            Clicks missing from the model's answer are captioned one by one.
+    """
+    contents = []
+    sections = ""
+    for i, click in enumerate(clicks, start=1):
+        formatted_time = (click.get("event_time") or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        contents.append(f"Click {i} (event time: {formatted_time}). Images: before, after"
+                        + (", thumbnail" if len(click["images"]) > 2 else "")
+                        + _focus_note(click.get("focus"), click["images"],
+                                      crops="The before/after images", thumbnail="The thumbnail"))
+        contents.extend(_image_part(image) for image in click["images"])
+        sections += f"""
+    ### Click {i}{CAPTION_FORMAT.format(formatted_time=formatted_time)}"""
+
+    system_prompt = f"""
+    You are an AI assistant specialized in analyzing pairs of screenshots. 
+    You will be given {len(clicks)} separate mouse clicks. Each click is introduced by a
+    "Click N" label followed by its images: before the click and after the click.
+    Analyze every click independently.
+{CAPTION_TASKS}
+    Answer with one section per click, each starting with its "### Click N" header line,
+    making sure to include the event time:{sections}"""
+
+    response = get_client(api_key).models.generate_content(
+        model=GEMINI_MODEL,
+        contents=contents + [system_prompt.strip()]
+    )
+
+    parts = re.split(r"^\s*#{2,}\s*Click\s+(\d+)\s*$", response.text or "", flags=re.MULTILINE)
+    captions = {int(number): text.strip() for number, text in zip(parts[1::2], parts[2::2])}
+    return [
+        captions.get(i) or screenshot_to_text(click["images"], api_key, click.get("focus"), click.get("event_time"))
+        for i, click in enumerate(clicks, start=1)
+    ]
+
+
+def restamp_caption(caption, event_time=None):
+    """
+    Input: caption in the screenshot_to_text format, datetime of the new event (default: now)
+    Output: the caption with its *Event Time:* line set to event_time, for reusing
+            a stored caption for a repeated transition
     """
-    with open(current_screenshot, "rb") as f:
-        image1_bytes = f.read()
+    formatted_time = (event_time or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+    return EVENT_TIME_PATTERN.sub(lambda m: m.group(1) + formatted_time, caption, count=1)
+
+
+def no_change_caption(click_coords, event_time=None):
+    """
+    Input: (x, y) of a click whose before/after screenshots are identical,
+           datetime of the click (default: now)
+    Output: Short caption in the same format as screenshot_to_text, without an LLM call
+    """
+    formatted_time = (event_time or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+    x, y = click_coords
+    return (
+        f"- *Event Time:* {formatted_time}\n"
+        f"- *Observed Change:* Clicking at ({x}, {y}) produced no visible change.\n"
+        f"- *Inferred Action:* The clicked spot is not interactive in the current state."
+    )
+
+
+def _user_response_contents(user_query, relevant_chat, current_screenshot, chunks):
+    """Build the Gemini request contents shared by get_user_response and its streaming variant."""
 
     # Stronger system prompt
     system_prompt = """
@@ -97,9 +201,7 @@ def get_user_response(user_query, relevant_chat, current_screenshot, chunks, api
 
     # Gather all retrieved info
     info = ""
-    for i, chunk_path in enumerate(chunks):
-        with open(chunk_path, "r") as f:
-            chunk = f.read()
+    for i, chunk in enumerate(chunks):
         info += f"[{i}] {chunk}\n"
 
     # User-specific prompt
@@ -116,15 +218,86 @@ def get_user_response(user_query, relevant_chat, current_screenshot, chunks, api
     provide the most useful guidance and make the most of use of previous contexts, for the user to progress in solving the puzzle.
     """
 
-    client = genai.Client(api_key=api_key)
+    return ([_image_part(current_screenshot)] if current_screenshot else []) + [
+        f"{system_prompt.strip()}\n\n{user_prompt.strip()}",
+    ]
+
+
+def get_user_response(user_query, relevant_chat, current_screenshot, chunks, api_key):
+    """
+    Inputs: 
+    1. user_query: string
+    2. relevant_chat: string
+    3. current_screenshot: encoded (bytes, mime_type), image path, or None
+    4. chunks: list of relevant texts
+
+    Output: 
+    Response: string
+    """
+    client = get_client(api_key)
 
     response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[
-            types.Part.from_bytes(data=image1_bytes, mime_type="image/png"),
-            f"{system_prompt.strip()}\n\n{user_prompt.strip()}",
-        ]
+        model=GEMINI_MODEL,
+        contents=_user_response_contents(user_query, relevant_chat, current_screenshot, chunks)
     )
 
     return response.text
 
+
+def get_user_response_stream(user_query, relevant_chat, current_screenshot, chunks, api_key):
+    """
+    Same inputs as get_user_response.
+
+    Output:
+    Generator yielding the response text chunk by chunk as the model produces it
+    """
+    client = get_client(api_key)
+
+    for chunk in client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=_user_response_contents(user_query, relevant_chat, current_screenshot, chunks)
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
+def summarize_chat(previous_summary, turns, api_key, max_words=150):
+    """
+    Inputs:
+    1. previous_summary: string (may be empty)
+    2. turns: list of {"user": ..., "ai": ...} dicts to fold into the summary
+    
+    Output:
+    Updated running summary: string
+    """
+    transcript = "\n".join(f"User: {t['user']}\nAI: {t['ai']}" for t in turns)
+    prompt = f"""
+    You maintain a running summary of a conversation between a user playing a game and an AI assistant.
+    Update the summary with the new turns below. Keep facts the user discovered, puzzles solved or
+    still open, items, codes and hints already given. Write at most {max_words} words.
+
+    Current summary:
+    {previous_summary or "(empty)"}
+
+    New turns:
+    {transcript}
+    """
+
+    response = get_client(api_key).models.generate_content(
+        model=GEMINI_MODEL,
+        contents=[prompt.strip()]
+    )
+
+    return response.text
+
+
+def embed_texts(texts, api_key):
+    """
+    Input: list of strings
+    Output: list of embedding vectors (lists of floats), one per text
+    """
+    response = get_client(api_key).models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=texts
+    )
+    return [embedding.values for embedding in response.embeddings]
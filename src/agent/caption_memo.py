@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+
+from src.image.diff import dhash, hamming_distance
+
+# ---------------------------
+# Caption memo for repeated screen transitions
+# ---------------------------
+class CaptionMemo:
+    """
+    Persistent store of captions keyed by perceptual hashes of a click.
+
+    A click is described by dHashes of the before frame, the after frame and
+    the changed region of the after frame, plus the click position rounded
+    to a bucket_px grid. lookup() returns the caption of the closest stored
+    click in the same or a neighbouring bucket whose hashes are each within
+    max_distance bits, so a repeated transition does not need a model call.
+
+    Entries live in a SQLite file shared by the click workers; once more than
+    max_entries are stored the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, max_entries=5000, max_distance=8, bucket_px=48, hash_size=16):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.bucket_px = bucket_px
+        self.hash_size = hash_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS captions (
+                id INTEGER PRIMARY KEY,
+                bx INTEGER,
+                by INTEGER,
+                before_hash TEXT NOT NULL,
+                after_hash TEXT NOT NULL,
+                change_hash TEXT NOT NULL,
+                caption TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                uses INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS captions_bucket ON captions (bx, by);
+            CREATE INDEX IF NOT EXISTS captions_last_used ON captions (last_used);
+        """)
+        self._count = self._conn.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def make_key(self, before, after, bbox, click_coords):
+        """
+        Input: before/after (H, W, 3) uint8 frames, bbox of the change from
+               frame_diff (or None), click (x, y) or None
+        Output: (bx, by, before_hash, after_hash, change_hash)
+        """
+        if bbox:
+            x0, y0, x1, y1 = bbox
+            change = after[y0:y1, x0:x1]
+        else:
+            change = after
+        bx, by = ((int(click_coords[0]) // self.bucket_px, int(click_coords[1]) // self.bucket_px)
+                  if click_coords else (None, None))
+        return (bx, by, dhash(before, self.hash_size), dhash(after, self.hash_size),
+                dhash(change, self.hash_size))
+
+    def lookup(self, key):
+        """Return the stored caption for a near-identical click, or None."""
+        bx, by, before_hash, after_hash, change_hash = key
+        with self._lock:
+            if bx is None:
+                rows = self._conn.execute(
+                    "SELECT id, bx, by, before_hash, after_hash, change_hash, caption FROM captions "
+                    "WHERE bx IS NULL").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, bx, by, before_hash, after_hash, change_hash, caption FROM captions "
+                    "WHERE bx BETWEEN ? AND ? AND by BETWEEN ? AND ?",
+                    (bx - 1, bx + 1, by - 1, by + 1)).fetchall()
+
+            best = None
+            for row_id, row_bx, row_by, *hashes, caption in rows:
+                distances = [hamming_distance(a, b) for a, b in zip(hashes, key[2:])]
+                if max(distances) > self.max_distance:
+                    continue
+                # Closest hashes first, then the click nearest to the stored one
+                rank = (sum(distances), abs((row_bx or 0) - (bx or 0)) + abs((row_by or 0) - (by or 0)))
+                if best is None or rank < best[0]:
+                    best = (rank, row_id, caption)
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE captions SET last_used = ?, uses = uses + 1 WHERE id = ?",
+                               (time.time(), best[1]))
+            self._conn.commit()
+            return best[2]
+
+    def store(self, key, caption):
+        """Remember the caption of a click, evicting the least recently used entries if full."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO captions (bx, by, before_hash, after_hash, change_hash, caption, "
+                "created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, caption, now, now))
+            self._count += 1
+            self.stores += 1
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM captions WHERE id IN "
+                    "(SELECT id FROM captions ORDER BY last_used LIMIT ?)", (excess,))
+                self._count -= excess
+                self.evictions += excess
+            self._conn.commit()
+
+    def __len__(self):
+        return self._count
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": self._count,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
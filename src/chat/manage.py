@@ -1,19 +1,134 @@
+import os
+import threading
+
 # ---------------------------
 # Chat history management
 # ---------------------------
-chat_history = []
-
-def add_to_chat_history(user_query: str, ai_response: str):
-    """Store user query and AI response in history."""
-    chat_history.append({
-        "user": user_query,
-        "ai": ai_response
-    })
-    return chat_history
-
-def format_history(chat_history):
-    if not chat_history:
-        return "No previous chat"
-    return "\n".join(
-        [f"User: {h['user']}\nAI: {h['ai']}" for h in chat_history]
-    )
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", 2000))
+CHAT_KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", 6))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def _format_turn(turn):
+    return f"User: {turn['user']}\nAI: {turn['ai']}"
+
+
+class ChatHistory:
+    """
+    Token-budgeted rolling chat history.
+
+    The last `keep_turns` turns are kept verbatim as long as they fit into
+    `token_budget` together with the summary. Older turns are folded into a
+    running summary by `summarizer(previous_summary, turns)` on a background
+    thread. The formatted verbatim segment is cached and only appended to
+    (or trimmed at the front), so formatting cost per turn stays flat.
+    """
+
+    def __init__(self, token_budget=CHAT_TOKEN_BUDGET, keep_turns=CHAT_KEEP_TURNS, summarizer=None):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+        self.summary = ""
+        self._turns = []          # (turn, formatted text, tokens)
+        self._segment = ""
+        self._segment_tokens = 0
+        self._pending = []        # evicted turns not yet folded into the summary
+        self._lock = threading.Lock()
+        self._summarizing = False
+        self._count = 0           # turns added so far, including summarized ones
+        self._last = None
+
+    def add(self, user_query: str, ai_response: str) -> int:
+        """Append a turn. Returns its turn number (0 for the first turn)."""
+        turn = {"user": user_query, "ai": ai_response}
+        text = _format_turn(turn)
+        with self._lock:
+            number = self._count
+            self._count += 1
+            self._last = turn
+            self._turns.append((turn, text, estimate_tokens(text)))
+            self._segment = f"{self._segment}\n{text}" if self._segment else text
+            self._segment_tokens += self._turns[-1][2]
+            self._evict()
+            start_summarizer = self._pending and not self._summarizing
+            if start_summarizer:
+                self._summarizing = True
+        if start_summarizer:
+            threading.Thread(target=self._summarize_pending, daemon=True).start()
+        return number
+
+    def _evict(self):
+        """Move the oldest verbatim turns to the pending list while over budget."""
+        budget = self.token_budget - estimate_tokens(self.summary)
+        while len(self._turns) > 1 and (len(self._turns) > self.keep_turns
+                                        or self._segment_tokens > budget):
+            turn, text, tokens = self._turns.pop(0)
+            self._segment = self._segment[len(text) + 1:]
+            self._segment_tokens -= tokens
+            self._pending.append(turn)
+
+    def _summarize_pending(self):
+        finished = False
+        try:
+            while True:
+                with self._lock:
+                    # Turns stay in _pending (and in the prompt) until folded
+                    turns = list(self._pending)
+                    if not turns:
+                        self._summarizing = False
+                        finished = True
+                        return
+                    previous = self.summary
+                try:
+                    summary = self.summarizer(previous, turns) if self.summarizer is not None else None
+                    if not isinstance(summary, str):
+                        summary = self._truncate_summary(previous, turns)
+                except Exception:
+                    summary = self._truncate_summary(previous, turns)
+                with self._lock:
+                    self.summary = summary.strip()
+                    self._pending = self._pending[len(turns):]
+        finally:
+            if not finished:
+                # A failed run must not leave the next add() thinking one is still going
+                with self._lock:
+                    self._summarizing = False
+
+    def _truncate_summary(self, previous, turns):
+        """Fallback without an LLM: keep the most recent text that fits a quarter of the budget."""
+        text = "\n".join([previous] + [_format_turn(t) for t in turns]).strip()
+        return text[-(self.token_budget // 4) * 4:]
+
+    def format(self) -> str:
+        with self._lock:
+            segment = "\n".join([_format_turn(t) for t in self._pending] + [self._segment]).strip()
+            if not segment and not self.summary:
+                return "No previous chat"
+            if not self.summary:
+                return segment
+            return f"Summary of earlier conversation:\n{self.summary}\n\nRecent turns:\n{segment}"
+
+    def recent_count(self) -> int:
+        """Number of newest turns currently included verbatim by format()."""
+        with self._lock:
+            return len(self._turns) + len(self._pending)
+
+    def last_turn(self):
+        """The newest turn as {"user", "ai"}, or None before the first one."""
+        with self._lock:
+            return self._last
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+
+history = ChatHistory()
+
+def add_to_chat_history(user_query: str, ai_response: str) -> int:
+    """Store user query and AI response in history. Returns the turn number."""
+    return history.add(user_query, ai_response)
@@ -0,0 +1,58 @@
+import threading
+import numpy as np
+
+# ---------------------------
+# Semantic recall over past chat turns
+# ---------------------------
+class ChatTurnIndex:
+    """
+    Small in-memory vector index of past chat turns.
+
+    `embedder(texts)` must return one vector per text. Vectors are L2
+    normalised, so search is a single matrix-vector product (cosine).
+    Every vector is stored with the number of its chat turn, so a turn
+    whose embedding failed leaves a gap instead of shifting later turns.
+    """
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self._texts = []
+        self._turns = []
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    def add(self, user_query: str, ai_response: str, turn=None):
+        """Embed and store one turn; turn is its position in the chat history (default: next)."""
+        text = f"User: {user_query}\nAI: {ai_response}"
+        vector = self._normalize(np.asarray(self.embedder([text]), dtype=np.float32))
+        with self._lock:
+            self._turns.append(len(self._turns) if turn is None else turn)
+            self._texts.append(text)
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+
+    def search(self, query: str, k: int = 3, before=None):
+        """
+        Return up to k past turns most similar to query, oldest first.
+        Only turns numbered below `before` are considered, so that turns
+        already in the prompt verbatim can be skipped.
+        """
+        with self._lock:
+            keep = [i for i, turn in enumerate(self._turns) if before is None or turn < before]
+            if not keep or k <= 0:
+                return []
+            vectors = self._vectors[keep]
+            texts = [self._texts[i] for i in keep]
+            turns = [self._turns[i] for i in keep]
+        query_vector = self._normalize(np.asarray(self.embedder([query]), dtype=np.float32))[0]
+        scores = vectors @ query_vector
+        top = np.argsort(-scores)[:k]
+        return [texts[i] for i in sorted(top, key=lambda i: turns[i])]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._texts)
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,100 @@
+import threading
+import time
+from difflib import SequenceMatcher
+
+from src.client_functions.cache import normalize_query
+
+# ---------------------------
+# Speculative retrieval while the user types
+# ---------------------------
+class PrefetchEntry:
+    """Retrieval results and encoded screenshot prepared for one draft message."""
+
+    def __init__(self, draft, queries):
+        self.draft = draft
+        self.queries = queries
+        self.version = None
+        self.results = None
+        self.screenshot = None
+        self.frame_hash = None
+        self.error = None
+        self.created_at = time.monotonic()
+        self.done = threading.Event()
+
+    def finish(self, results=None, version=None, screenshot=None, frame_hash=None, error=None):
+        self.results = results
+        self.version = version
+        self.screenshot = screenshot
+        self.frame_hash = frame_hash
+        self.error = error
+        self.done.set()
+
+
+class ChatPrefetch:
+    """
+    Latest speculative prefetch for the chat draft.
+
+    start() registers a prefetch for a draft before its worker runs, so that
+    a send that happens while it is still running can wait for it instead of
+    starting the same retrieval again. match() hands out the entry when the
+    sent message is close enough to the draft, the follow-up queries are
+    built from the same history and the index version has not changed.
+    """
+
+    def __init__(self, min_similarity=0.9, max_age=60.0):
+        self.min_similarity = min_similarity
+        self.max_age = max_age
+        self._entry = None
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, draft, queries):
+        entry = PrefetchEntry(draft, queries)
+        with self._lock:
+            self._entry = entry
+            self.started += 1
+        return entry
+
+    def similarity(self, draft, message):
+        a, b = normalize_query(draft), normalize_query(message)
+        if a == b:
+            return 1.0
+        return SequenceMatcher(None, a, b).ratio()
+
+    def match(self, message, history_queries, version, wait=0.0):
+        """
+        Return the finished entry usable for message, or None.
+
+        Args:
+            message: The message being sent
+            history_queries: The extra (follow-up) queries it would be retrieved with
+            version: Current index version
+            wait: Seconds to wait for a matching prefetch that is still running
+        """
+        with self._lock:
+            entry = self._entry
+        usable = (
+            entry is not None
+            and time.monotonic() - entry.created_at <= self.max_age
+            and entry.queries[1:] == history_queries
+            and self.similarity(entry.draft, message) >= self.min_similarity
+            and entry.done.wait(wait)
+            and entry.error is None
+            and entry.version == version
+        )
+        with self._lock:
+            if usable:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry if usable else None
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+    def stats(self):
+        with self._lock:
+            return {"started": self.started, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,302 @@
+"""
+Pathway RAG Server Client (asyncio)
+Async counterparts of the endpoint functions in endpoints.py, for running
+several lookups concurrently over one pooled connection.
+"""
+
+import asyncio
+import threading
+import time
+import httpx
+from typing import Dict, List, Optional, Any, Tuple
+
+from src.client_functions.endpoints import (
+    DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TIMEOUTS, DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES, DEFAULT_POOL_SIZE, _get_base_url, get_client,
+    PathwayClient
+)
+from src.client_functions.cache import RetrievalCache, index_version
+from src.client_functions.recency import (
+    time_range_filter, rerank_by_recency, DEFAULT_RECENCY_CANDIDATES
+)
+
+
+class AsyncPathwayClient:
+    """
+    Async HTTP client for the Pathway server.
+
+    Wraps one ``httpx.AsyncClient`` so that concurrent requests share a single
+    keep-alive connection pool. Use it as an async context manager:
+
+        >>> async with AsyncPathwayClient() as client:
+        ...     docs = await client.retrieve("red key", k=3)
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+                 timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+                 cache: Optional[RetrievalCache] = None,
+                 sync_client: Optional[PathwayClient] = None):
+        """
+        Args:
+            host: Server host
+            port: Server port
+            pool_size: Maximum number of kept-alive connections
+            retries: Retries for failed connection attempts
+            timeouts: Optional per-endpoint (connect, read) timeout overrides
+            cache: Retrieval cache used when retrieve is called with use_cache
+                (default: the one of the shared sync client for host:port)
+            sync_client: Client whose ingestion tracker wait_fresh_ms waits on
+                (default: the shared sync client for host:port)
+        """
+        self.sync_client = sync_client if sync_client is not None else get_client(host, port)
+        self.cache = cache if cache is not None else self.sync_client.retrieval_cache
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.client = httpx.AsyncClient(
+            base_url=_get_base_url(host, port),
+            headers={"accept": "*/*", "Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _post(self, endpoint: str, data: Optional[Dict] = None) -> Any:
+        """
+        Make async HTTP POST request over the pooled client.
+
+        Raises:
+            Exception: If request fails or times out
+        """
+        connect, read = self.timeouts.get(endpoint, (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT))
+        try:
+            response = await self.client.post(endpoint, json=data,
+                                              timeout=httpx.Timeout(read, connect=connect))
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"Request to {endpoint} failed: {str(e)}")
+
+    async def answer(self, prompt: str, filters: Optional[str] = None) -> Dict[str, Any]:
+        payload = {"prompt": prompt}
+        if filters:
+            payload["filters"] = filters
+        return await self._post("/v2/answer", data=payload)
+
+    async def retrieve(self, query: str, k: int = 3, metadata_filter: Optional[str] = None,
+                       use_cache: bool = False, since: Optional[float] = None,
+                       until: Optional[float] = None,
+                       recency_half_life: Optional[float] = None,
+                       wait_fresh_ms: float = 0) -> List[Dict[str, Any]]:
+        if wait_fresh_ms:
+            await self.wait_fresh(wait_fresh_ms)
+        metadata_filter = time_range_filter(since, until, metadata_filter)
+        if not recency_half_life:
+            return await self._retrieve(query, k, metadata_filter, use_cache)
+        candidates = await self._retrieve(query, k * DEFAULT_RECENCY_CANDIDATES,
+                                          metadata_filter, use_cache)
+        return rerank_by_recency(candidates, recency_half_life, k)
+
+    async def _retrieve(self, query: str, k: int, metadata_filter: Optional[str],
+                        use_cache: bool) -> List[Dict[str, Any]]:
+        payload = {
+            "query": query,
+            "k": k
+        }
+        if metadata_filter:
+            payload["metadata_filter"] = metadata_filter
+        if not use_cache:
+            return await self._post("/v1/retrieve", data=payload)
+
+        await self._refresh_cache_version()
+        key = self.cache.make_key(query, k, metadata_filter)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        result = await self._post("/v1/retrieve", data=payload)
+        self.cache.put(key, result, time.perf_counter() - start)
+        return result
+
+    async def _refresh_cache_version(self):
+        if self.cache.needs_version_check():
+            self.cache.update_version(index_version(await self.statistics()))
+
+    async def wait_fresh(self, wait_ms: float) -> bool:
+        """Async version of PathwayClient.wait_fresh (the wait runs in a thread)."""
+        return await asyncio.to_thread(self.sync_client.wait_fresh, wait_ms)
+
+    async def list_documents(self) -> List[Dict[str, Any]]:
+        return await self._post("/v2/list_documents")
+
+    async def statistics(self) -> Dict[str, Any]:
+        return await self._post("/v1/statistics")
+
+    async def retrieve_many(self, queries: List[str], k: int = 3,
+                            metadata_filter: Optional[str] = None,
+                            use_cache: bool = False, since: Optional[float] = None,
+                            until: Optional[float] = None,
+                            recency_half_life: Optional[float] = None,
+                            wait_fresh_ms: float = 0) -> List[Dict[str, Any]]:
+        """Run retrieve for every query concurrently and merge the results."""
+        if wait_fresh_ms:
+            await self.wait_fresh(wait_fresh_ms)
+        if use_cache:
+            # One version check for the whole batch instead of one per query
+            await self._refresh_cache_version()
+        metadata_filter = time_range_filter(since, until, metadata_filter)
+        per_query = k * DEFAULT_RECENCY_CANDIDATES if recency_half_life else k
+        results = await asyncio.gather(
+            *(self._retrieve(query, per_query, metadata_filter, use_cache)
+              for query in queries)
+        )
+        merged = merge_results(results)
+        if recency_half_life:
+            # Re-rank the merged candidates, so recency decides across queries too
+            merged = rerank_by_recency(merged, recency_half_life, k * len(queries))
+        return merged
+
+    async def aclose(self):
+        """Close all pooled connections."""
+        await self.client.aclose()
+
+
+class BackgroundAsyncClient:
+    """
+    An AsyncPathwayClient running on its own long-lived event loop thread.
+
+    Lets synchronous code (e.g. QThreadPool workers) use the async client
+    without building a new event loop and connection pool per call, so
+    keep-alive connections are reused across calls:
+
+        >>> background = BackgroundAsyncClient()
+        >>> docs = background.retrieve_many(["red key", "open the chest"], k=3)
+        >>> background.close()
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **client_kwargs):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="pathway-async", daemon=True)
+        self._thread.start()
+        self.client = self.run(self._create_client(host, port, client_kwargs))
+
+    @staticmethod
+    async def _create_client(host, port, client_kwargs):
+        return AsyncPathwayClient(host, port, **client_kwargs)
+
+    def run(self, coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the client's loop and wait for its result. Thread-safe."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def retrieve(self, query: str, **kwargs) -> List[Dict[str, Any]]:
+        return self.run(self.client.retrieve(query, **kwargs))
+
+    def retrieve_many(self, queries: List[str], **kwargs) -> List[Dict[str, Any]]:
+        return self.run(self.client.retrieve_many(queries, **kwargs))
+
+    def close(self):
+        """Close the pooled connections and stop the loop thread."""
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def merge_results(results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merge several retrieve() result lists, dropping duplicates.
+
+    Documents are told apart by metadata.path and event_ts, since a JSONL
+    caption segment holds many captions under one path. When the same
+    document is returned for more than one query the entry with the smallest
+    distance is kept. The merged list is sorted by distance.
+    """
+    best = {}
+    for result in results:
+        for doc in result:
+            metadata = doc.get("metadata", {})
+            key = (metadata.get("path"), metadata.get("event_ts")) if metadata.get("path") else doc.get("text")
+            if key not in best or doc.get("dist", 0) < best[key].get("dist", 0):
+                best[key] = doc
+    return sorted(best.values(), key=lambda doc: doc.get("dist", 0))
+
+
+# Async Functions
+
+async def async_answer(prompt: str, filters: Optional[str] = None,
+                       host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Dict[str, Any]:
+    """Async version of endpoints.answer."""
+    async with AsyncPathwayClient(host, port) as client:
+        return await client.answer(prompt, filters=filters)
+
+
+async def async_retrieve(query: str, k: int = 3, metadata_filter: Optional[str] = None,
+                         host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                         use_cache: bool = False, since: Optional[float] = None,
+                         until: Optional[float] = None,
+                         recency_half_life: Optional[float] = None,
+                         wait_fresh_ms: float = 0) -> List[Dict[str, Any]]:
+    """Async version of endpoints.retrieve."""
+    async with AsyncPathwayClient(host, port) as client:
+        return await client.retrieve(query, k=k, metadata_filter=metadata_filter,
+                                     use_cache=use_cache, since=since, until=until,
+                                     recency_half_life=recency_half_life,
+                                     wait_fresh_ms=wait_fresh_ms)
+
+
+async def async_list_documents(host: str = DEFAULT_HOST,
+                               port: int = DEFAULT_PORT) -> List[Dict[str, Any]]:
+    """Async version of endpoints.list_documents."""
+    async with AsyncPathwayClient(host, port) as client:
+        return await client.list_documents()
+
+
+async def async_statistics(host: str = DEFAULT_HOST,
+                           port: int = DEFAULT_PORT) -> Dict[str, Any]:
+    """Async version of endpoints.statistics."""
+    async with AsyncPathwayClient(host, port) as client:
+        return await client.statistics()
+
+
+async def retrieve_many(queries: List[str], k: int = 3, metadata_filter: Optional[str] = None,
+                        host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                        use_cache: bool = False, since: Optional[float] = None,
+                        until: Optional[float] = None,
+                        recency_half_life: Optional[float] = None,
+                        wait_fresh_ms: float = 0) -> List[Dict[str, Any]]:
+    """
+    Retrieve documents for several queries concurrently over one pooled connection.
+    
+    Args:
+        queries: Search query texts (e.g. the user message and its rewrites)
+        k: Number of results to return per query
+        metadata_filter: Optional filter on document metadata
+        host: Server host
+        port: Server port
+        use_cache: Serve repeated queries from the shared retrieval cache
+        since: Only return events at or after this epoch time
+        until: Only return events at or before this epoch time
+        recency_half_life: If set, re-rank the merged candidates by similarity
+            blended with a recency decay of this half-life (seconds)
+        wait_fresh_ms: Wait up to this long for tracked captions to be
+            indexed before searching
+        
+    Returns:
+        Merged list of retrieved documents, deduplicated by metadata.path and event_ts
+        and sorted by distance
+        
+    Example:
+        >>> asyncio.run(retrieve_many(["red key", "open the chest"], k=3))
+    """
+    async with AsyncPathwayClient(host, port) as client:
+        return await client.retrieve_many(queries, k=k, metadata_filter=metadata_filter,
+                                          use_cache=use_cache, since=since, until=until,
+                                          recency_half_life=recency_half_life,
+                                          wait_fresh_ms=wait_fresh_ms)
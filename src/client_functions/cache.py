@@ -0,0 +1,119 @@
+"""
+Client-side retrieval cache
+LRU/TTL cache for /v1/retrieve results, invalidated when the indexer state changes.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', 256))
+DEFAULT_CACHE_TTL = float(os.getenv('RETRIEVAL_CACHE_TTL', 300.0))
+# How often (seconds) the index version is re-read from /v1/statistics.
+DEFAULT_VERSION_CHECK_INTERVAL = float(os.getenv('RETRIEVAL_CACHE_VERSION_INTERVAL', 1.0))
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def index_version(stats: Dict[str, Any]) -> Tuple:
+    """
+    Derive a cheap index version from a statistics() response.
+
+    Any change in the number of indexed files or in the newest
+    modification/indexing timestamp counts as a new version.
+    """
+    return (stats.get("file_count"), stats.get("last_modified"), stats.get("last_indexed"))
+
+
+class RetrievalCache:
+    """
+    Thread-safe LRU cache with TTL for retrieve() results.
+
+    Keys are (normalized query, k, metadata_filter). The whole cache is
+    dropped as soon as a new index version is reported via update_version().
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL,
+                 version_check_interval: float = DEFAULT_VERSION_CHECK_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(query: str, k: int, metadata_filter: Optional[str] = None) -> Tuple:
+        return (normalize_query(query), k, metadata_filter or None)
+
+    @property
+    def version(self) -> Optional[Tuple]:
+        """Index version the cached entries belong to (None before the first check)."""
+        return self._version
+
+    def needs_version_check(self) -> bool:
+        return time.monotonic() - self._version_checked_at >= self.version_check_interval
+
+    def expire_version(self):
+        """Make the next lookup re-read the index version (e.g. a new document was indexed)."""
+        self._version_checked_at = 0.0
+
+    def update_version(self, version: Tuple):
+        """Record the current index version, clearing the cache if it changed."""
+        with self._lock:
+            self._version_checked_at = time.monotonic()
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._version = version
+                self._entries.clear()
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return list(entry[1])
+
+    def put(self, key: Tuple, value: Any, fetch_seconds: float = 0.0):
+        """Store a result together with the round-trip time it took to fetch."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(value), fetch_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and the Pathway round-trip time saved by hits."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "saved_seconds": self.saved_seconds,
+            }
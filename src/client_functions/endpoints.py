@@ -3,26 +3,209 @@ Pathway RAG Server Client
 Simple procedural functions for interacting with Pathway AI Pipeline REST API.
 """
 
+import threading
+import time
 import requests
-from typing import Dict, List, Optional, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Optional, Any, Tuple
 from dotenv import load_dotenv
 import os
 
+from src.client_functions.cache import RetrievalCache, index_version
+from src.client_functions.ingestion import IngestionTracker
+from src.client_functions.recency import (
+    time_range_filter, rerank_by_recency, DEFAULT_RECENCY_CANDIDATES
+)
+
 load_dotenv()
 
 DEFAULT_HOST = os.getenv('PATHWAY_HOST')
 DEFAULT_PORT = os.getenv('PATHWAY_PORT')
 
+# (connect, read) timeouts in seconds. LLM-backed endpoints get a long read
+# timeout, index lookups are expected to come back quickly.
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv('PATHWAY_CONNECT_TIMEOUT', 3.05))
+DEFAULT_TIMEOUTS = {
+    "/v2/answer": (DEFAULT_CONNECT_TIMEOUT, 120.0),
+    "/v2/summarize": (DEFAULT_CONNECT_TIMEOUT, 120.0),
+    "/v1/retrieve": (DEFAULT_CONNECT_TIMEOUT, 20.0),
+    "/v2/list_documents": (DEFAULT_CONNECT_TIMEOUT, 20.0),
+    "/v1/statistics": (DEFAULT_CONNECT_TIMEOUT, 5.0),
+}
+DEFAULT_READ_TIMEOUT = float(os.getenv('PATHWAY_READ_TIMEOUT', 30.0))
+DEFAULT_RETRIES = int(os.getenv('PATHWAY_RETRIES', 2))
+DEFAULT_POOL_SIZE = int(os.getenv('PATHWAY_POOL_SIZE', 10))
+
 
 def _get_base_url(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> str:
     """Get the base URL for the Pathway server."""
     return f"http://{host}:{port}"
 
 
+class PathwayClient:
+    """
+    Pooled HTTP client for the Pathway server.
+
+    Keeps one ``requests.Session`` with a keep-alive connection pool, applies
+    per-endpoint (connect, read) timeouts and retries failed connections and
+    5xx gateway errors a bounded number of times. Safe to share between
+    QThreadPool workers.
+
+    ``retrieval_cache`` holds results of ``retrieve(..., use_cache=True)``
+    calls and is shared with the async client for the same server.
+    ``ingestion`` follows written captions until the server lists them, for
+    ``retrieve(..., wait_fresh_ms=...)``.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+                 backoff_factor: float = 0.2,
+                 timeouts: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        Args:
+            host: Server host
+            port: Server port
+            pool_size: Maximum number of kept-alive connections
+            retries: Retries for connection errors and 502/503/504 responses
+            backoff_factor: Exponential backoff factor between retries
+            timeouts: Optional per-endpoint (connect, read) timeout overrides
+        """
+        self.base_url = _get_base_url(host, port)
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        # Read retries are disabled on purpose: a read timeout means the
+        # server is busy, and resending an answer prompt only doubles the wait.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "accept": "*/*",
+            "Content-Type": "application/json"
+        })
+        self.retrieval_cache = RetrievalCache()
+        self.ingestion = IngestionTracker(self.list_documents)
+        # A newly indexed caption changes results the cache may still hold
+        self.ingestion.add_listener(lambda *_: self.retrieval_cache.expire_version())
+
+    def _post(self, endpoint: str, data: Optional[Dict] = None) -> Any:
+        """
+        Make HTTP POST request over the pooled session.
+
+        Raises:
+            Exception: If request fails or times out
+        """
+        timeout = self.timeouts.get(endpoint, (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT))
+        try:
+            response = self.session.post(f"{self.base_url}{endpoint}", json=data,
+                                         timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            raise Exception(f"Request to {endpoint} failed: {str(e)}")
+
+    def answer(self, prompt: str, filters: Optional[str] = None) -> Dict[str, Any]:
+        payload = {"prompt": prompt}
+        if filters:
+            payload["filters"] = filters
+        return self._post("/v2/answer", data=payload)
+
+    def summarize(self, texts: List[str]) -> Dict[str, Any]:
+        return self._post("/v2/summarize", data={"texts": texts})
+
+    def retrieve(self, query: str, k: int = 3, metadata_filter: Optional[str] = None,
+                 use_cache: bool = False, since: Optional[float] = None,
+                 until: Optional[float] = None,
+                 recency_half_life: Optional[float] = None,
+                 wait_fresh_ms: float = 0) -> List[Dict[str, Any]]:
+        if wait_fresh_ms:
+            self.wait_fresh(wait_fresh_ms)
+        metadata_filter = time_range_filter(since, until, metadata_filter)
+        if not recency_half_life:
+            return self._retrieve(query, k, metadata_filter, use_cache)
+        candidates = self._retrieve(query, k * DEFAULT_RECENCY_CANDIDATES, metadata_filter, use_cache)
+        return rerank_by_recency(candidates, recency_half_life, k)
+
+    def _retrieve(self, query: str, k: int, metadata_filter: Optional[str],
+                  use_cache: bool) -> List[Dict[str, Any]]:
+        payload = {
+            "query": query,
+            "k": k
+        }
+        if metadata_filter:
+            payload["metadata_filter"] = metadata_filter
+        if not use_cache:
+            return self._post("/v1/retrieve", data=payload)
+
+        cache = self.retrieval_cache
+        if cache.needs_version_check():
+            cache.update_version(index_version(self.statistics()))
+        key = cache.make_key(query, k, metadata_filter)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        result = self._post("/v1/retrieve", data=payload)
+        cache.put(key, result, time.perf_counter() - start)
+        return result
+
+    def wait_fresh(self, wait_ms: float) -> bool:
+        """
+        Wait up to wait_ms for tracked captions to be indexed.
+
+        Returns:
+            False if some were still pending when the wait ended
+        """
+        if not self.ingestion.pending():
+            return True
+        fresh = self.ingestion.wait_until_fresh(wait_ms / 1000)
+        self.retrieval_cache.expire_version()
+        return fresh
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        return self._post("/v2/list_documents")
+
+    def statistics(self) -> Dict[str, Any]:
+        return self._post("/v1/statistics")
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+
+_clients: Dict[Tuple[str, str], PathwayClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> PathwayClient:
+    """Return the shared PathwayClient for host:port, creating it on first use."""
+    key = (str(host), str(port))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = PathwayClient(host, port)
+            _clients[key] = client
+        return client
+
+
 def _make_request(endpoint: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
                  data: Optional[Dict] = None) -> Dict[str, Any]:
     """
-    Make HTTP POST request to Pathway server.
+    Make HTTP POST request to Pathway server through the shared pooled client.
     
     Args:
         endpoint: API endpoint path
@@ -36,18 +219,7 @@ def _make_request(endpoint: str, host: str = DEFAULT_HOST, port: int = DEFAULT_P
     Raises:
         Exception: If request fails
     """
-    url = f"{_get_base_url(host, port)}{endpoint}"
-    headers = {
-        "accept": "*/*",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        raise Exception(f"Request to {endpoint} failed: {str(e)}")
+    return get_client(host, port)._post(endpoint, data=data)
 
 
 # LLM and RAG Functions
@@ -70,11 +242,7 @@ def answer(prompt: str, filters: Optional[str] = None,
         >>> result = answer("What are the terms and conditions?")
         >>> print(result['response'])
     """
-    payload = {"prompt": prompt}
-    if filters:
-        payload["filters"] = filters
-    
-    return _make_request("/v2/answer", host, port, data=payload)
+    return get_client(host, port).answer(prompt, filters=filters)
 
 
 def summarize(texts: List[str], host: str = DEFAULT_HOST, 
@@ -93,14 +261,17 @@ def summarize(texts: List[str], host: str = DEFAULT_HOST,
     Example:
         >>> summarize(["Long text 1...", "Long text 2..."])
     """
-    payload = {"texts": texts}
-    return _make_request("/v2/summarize", host, port, data=payload)
+    return get_client(host, port).summarize(texts)
 
 
 # Document Indexing Functions
 
 def retrieve(query: str, k: int = 3, metadata_filter: Optional[str] = None,
-            host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> List[Dict[str, Any]]:
+            host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+            use_cache: bool = False, since: Optional[float] = None,
+            until: Optional[float] = None,
+            recency_half_life: Optional[float] = None,
+            wait_fresh_ms: float = 0) -> List[Dict[str, Any]]:
     """
     Perform similarity search to retrieve relevant documents.
     
@@ -110,6 +281,14 @@ def retrieve(query: str, k: int = 3, metadata_filter: Optional[str] = None,
         metadata_filter: Optional filter on document metadata
         host: Server host
         port: Server port
+        use_cache: Serve repeated queries from the client-side cache until
+            the indexer reports a change
+        since: Only return events at or after this epoch time (event_ts metadata)
+        until: Only return events at or before this epoch time
+        recency_half_life: If set, fetch more candidates and re-rank them by
+            similarity blended with a recency decay of this half-life (seconds)
+        wait_fresh_ms: Wait up to this long for captions registered with
+            track_ingestion() to be indexed before searching (read-your-writes)
         
     Returns:
         List of dictionaries containing retrieved documents and scores
@@ -117,15 +296,13 @@ def retrieve(query: str, k: int = 3, metadata_filter: Optional[str] = None,
     Example:
         >>> retrieve("contract terms", k=5)
         >>> retrieve("earnings", metadata_filter="path:2023")
+        >>> retrieve("what did I click", since=time.time() - 60)
+        >>> retrieve("what did I just click", wait_fresh_ms=1000)
     """
-    payload = {
-        "query": query,
-        "k": k
-    }
-    if metadata_filter:
-        payload["metadata_filter"] = metadata_filter
-    
-    return _make_request("/v1/retrieve", host, port, data=payload)
+    return get_client(host, port).retrieve(query, k=k, metadata_filter=metadata_filter,
+                                           use_cache=use_cache, since=since, until=until,
+                                           recency_half_life=recency_half_life,
+                                           wait_fresh_ms=wait_fresh_ms)
 
 
 def list_documents(host: str = DEFAULT_HOST, 
@@ -146,7 +323,7 @@ def list_documents(host: str = DEFAULT_HOST,
         >>> for doc in docs:
         ...     print(doc['path'])
     """
-    return _make_request("/v2/list_documents", host, port)
+    return get_client(host, port).list_documents()
 
 
 def statistics(host: str = DEFAULT_HOST, 
@@ -165,7 +342,53 @@ def statistics(host: str = DEFAULT_HOST,
         >>> stats = statistics()
         >>> print(f"Total documents: {stats['total_documents']}")
     """
-    return _make_request("/v1/statistics", host, port)
+    return get_client(host, port).statistics()
+
+
+def cache_stats(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Dict[str, Any]:
+    """
+    Get hit/miss counters of the client-side retrieval cache.
+    
+    Args:
+        host: Server host
+        port: Server port
+        
+    Returns:
+        Dictionary with hits, misses, hit_rate, invalidations, entries
+        and saved_seconds (Pathway round-trip time avoided by hits)
+    """
+    return get_client(host, port).retrieval_cache.stats()
+
+
+def track_ingestion(path: str, caption_id: Optional[str] = None, key: Optional[str] = None,
+                    host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """
+    Follow a newly written caption until list_documents() reports it.
+    
+    Args:
+        path: File the caption was written to
+        caption_id: caption_id of the caption row when path is a JSONL segment
+        key: Optional id passed on to ingestion listeners (e.g. "click-12")
+        host: Server host
+        port: Server port
+    """
+    get_client(host, port).ingestion.track(path, caption_id, key)
+
+
+def ingestion_stats(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> Dict[str, Any]:
+    """
+    Get counters and write-to-visible lag of tracked captions.
+    
+    Args:
+        host: Server host
+        port: Server port
+        
+    Returns:
+        Dictionary with pending, oldest_pending_seconds, tracked, visible,
+        timed_out, polls, poll_errors, fresh_waits, fresh_timeouts and lag
+        (count, mean, p50, p90, p99, max in seconds)
+    """
+    return get_client(host, port).ingestion.stats()
 
 
 # Convenience Functions
@@ -0,0 +1,204 @@
+"""
+Ingestion tracking
+Follows caption files from the moment they are written until the indexer
+reports them in list_documents(), so retrieval can wait for its own writes.
+
+list_documents() lists what the server has ingested (parsed and stored in
+the document store); embedding and indexing that row for search may finish
+slightly later, so "visible" here is an upper bound on freshness, not a
+guarantee that the next query already finds the caption.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.pipeline.timing import Histogram
+
+# Seconds between list_documents() polls while captions are pending: the
+# interval doubles up to the maximum while nothing new shows up and starts
+# over when a caption becomes visible or a new one is tracked.
+DEFAULT_POLL_INTERVAL = float(os.getenv('INGESTION_POLL_INTERVAL', 0.1))
+DEFAULT_MAX_POLL_INTERVAL = float(os.getenv('INGESTION_MAX_POLL_INTERVAL', 2.0))
+# Captions not visible after this many seconds are given up on.
+DEFAULT_INGESTION_TIMEOUT = float(os.getenv('INGESTION_TIMEOUT', 60.0))
+
+
+def document_key(path: str, caption_id: Optional[str] = None) -> Tuple:
+    """
+    Identify an indexed caption by file name and, for rows of a JSONL
+    segment (many captions per file), by the caption_id written with it.
+
+    The server reports paths relative to its own data directory, so only
+    the base name is compared.
+    """
+    return (os.path.basename(path), caption_id)
+
+
+class IngestionTracker:
+    """
+    Thread-safe tracker of written but not yet indexed captions.
+
+    track() registers a caption; one background thread polls
+    list_documents() for all pending captions at once and records the
+    write-to-visible lag of each. wait_until_fresh() blocks until everything
+    tracked before the call is visible, for read-your-writes retrieval.
+    Listeners added with add_listener() are called as
+    listener(key, path, written, seen) from the polling thread, with
+    time.perf_counter() readings.
+    """
+
+    def __init__(self, list_documents: Callable[[], List[Dict[str, Any]]],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                 timeout: float = DEFAULT_INGESTION_TIMEOUT):
+        self.list_documents = list_documents
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.lag = Histogram()
+        self._pending = {}
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.tracked = 0
+        self.visible = 0
+        self.timed_out = 0
+        self.polls = 0
+        self.poll_errors = 0
+        self.fresh_waits = 0
+        self.fresh_timeouts = 0
+
+    def add_listener(self, listener: Callable[[Optional[str], str, float, float], None]):
+        self._listeners.append(listener)
+
+    def track(self, path: str, caption_id: Optional[str] = None, key: Optional[str] = None,
+              written: Optional[float] = None):
+        """
+        Follow a caption until it is indexed.
+
+        Args:
+            path: File the caption was written to
+            caption_id: caption_id of the row in a JSONL segment, unique
+                within the segment (None for one file per caption)
+            key: Click id passed on to listeners (e.g. "click-12")
+            written: time.perf_counter() reading of the write (default: now)
+        """
+        written = written if written is not None else time.perf_counter()
+        with self._cond:
+            self._pending[document_key(path, caption_id)] = (path, key, written)
+            self.tracked += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ingestion-tracker", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def wait_until_fresh(self, timeout: float) -> bool:
+        """
+        Block until every caption tracked so far is visible (or given up on).
+
+        Returns:
+            False if some of them were still pending after timeout seconds
+        """
+        with self._cond:
+            waiting = set(self._pending)
+            if not waiting:
+                return True
+            self.fresh_waits += 1
+            fresh = self._cond.wait_for(lambda: waiting.isdisjoint(self._pending), timeout)
+            if not fresh:
+                self.fresh_timeouts += 1
+            return fresh
+
+    def _run(self):
+        delay = self.poll_interval
+        polled_tracked = self.tracked
+        while self._wait(delay):
+            try:
+                docs = self.list_documents()
+            except Exception:
+                docs = None
+            seen = time.perf_counter()
+            visible = []
+            with self._cond:
+                self.polls += 1
+                if docs is None:
+                    self.poll_errors += 1
+                else:
+                    indexed = set()
+                    for doc in docs:
+                        path = doc.get("path") or ""
+                        indexed.add(document_key(path))
+                        if doc.get("caption_id") is not None:
+                            indexed.add(document_key(path, doc["caption_id"]))
+                    for doc_key in [k for k in self._pending if k in indexed]:
+                        path, key, written = self._pending.pop(doc_key)
+                        self.lag.observe(seen - written)
+                        visible.append((key, path, written))
+                    self.visible += len(visible)
+                for doc_key, (_, _, written) in list(self._pending.items()):
+                    if seen - written > self.timeout:
+                        del self._pending[doc_key]
+                        self.timed_out += 1
+                self._cond.notify_all()
+                new_tracked = self.tracked != polled_tracked
+                polled_tracked = self.tracked
+
+            for key, path, written in visible:
+                for listener in self._listeners:
+                    listener(key, path, written, seen)
+            delay = self.poll_interval if visible or new_tracked else min(delay * 2, self.max_poll_interval)
+
+    def _wait(self, delay: float) -> bool:
+        """
+        Sleep until the next poll is due. Idles while nothing is pending; a
+        newly tracked caption brings the poll forward to poll_interval.
+        Returns False once the tracker is closed.
+        """
+        with self._cond:
+            deadline = time.monotonic() + delay
+            tracked = self.tracked
+            while not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    deadline = time.monotonic() + self.poll_interval
+                    tracked = self.tracked
+                    continue
+                if self.tracked != tracked:
+                    tracked = self.tracked
+                    deadline = min(deadline, time.monotonic() + self.poll_interval)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and the write-to-visible lag (seconds) of tracked captions."""
+        with self._cond:
+            now = time.perf_counter()
+            oldest = min((written for _, _, written in self._pending.values()), default=None)
+            return {
+                "pending": len(self._pending),
+                "oldest_pending_seconds": now - oldest if oldest is not None else 0.0,
+                "tracked": self.tracked,
+                "visible": self.visible,
+                "timed_out": self.timed_out,
+                "polls": self.polls,
+                "poll_errors": self.poll_errors,
+                "fresh_waits": self.fresh_waits,
+                "fresh_timeouts": self.fresh_timeouts,
+                "lag": self.lag.summary(),
+            }
+
+    def close(self):
+        """Stop the polling thread; pending captions are no longer followed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
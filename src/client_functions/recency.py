@@ -0,0 +1,100 @@
+"""
+Time-window filters and recency re-ranking for retrieve()
+Every indexed caption carries its event time as numeric ``event_ts`` metadata
+(epoch seconds), set by pathway/app.py.
+"""
+
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+# Share of the final score given to recency when re-ranking (0..1).
+DEFAULT_RECENCY_WEIGHT = float(os.getenv('RECENCY_WEIGHT', 0.3))
+# How many times k candidates are fetched before re-ranking by recency.
+DEFAULT_RECENCY_CANDIDATES = int(os.getenv('RECENCY_CANDIDATES', 3))
+
+
+def window_start(window_seconds: float, now: Optional[float] = None, steps: int = 20) -> float:
+    """
+    Start of a "last window_seconds" time window, rounded down to whole
+    window_seconds / steps (at least one second).
+
+    The start becomes part of the metadata_filter and so of the retrieval
+    cache key; rounding keeps it stable across queries a few moments apart,
+    at the cost of widening the window by at most one step.
+
+    Example:
+        >>> window_start(600, now=1700000123.4)
+        1699999500.0
+    """
+    now = time.time() if now is None else now
+    step = max(1.0, window_seconds / steps)
+    return math.floor((now - window_seconds) / step) * step
+
+
+def time_range_filter(since: Optional[float] = None, until: Optional[float] = None,
+                      metadata_filter: Optional[str] = None) -> Optional[str]:
+    """
+    Build a JMESPath metadata_filter restricting results to an event time range.
+
+    Args:
+        since: Keep events at or after this epoch time
+        until: Keep events at or before this epoch time
+        metadata_filter: Optional existing filter, combined with ``&&``
+
+    Returns:
+        Filter string for /v1/retrieve, or None when nothing is restricted
+
+    Example:
+        >>> time_range_filter(since=1700000000)
+        '!!event_ts && event_ts >= to_number(`1700000000.0`)'
+    """
+    # The server turns `...` literals into raw strings, hence to_number().
+    # The !!event_ts guard keeps the expression boolean for documents
+    # without event_ts, which the engine would otherwise reject.
+    clauses = []
+    if since is not None:
+        clauses.append(f"event_ts >= to_number(`{float(since)!r}`)")
+    if until is not None:
+        clauses.append(f"event_ts <= to_number(`{float(until)!r}`)")
+    if clauses:
+        clauses.insert(0, "!!event_ts")
+    if metadata_filter:
+        clauses.append(f"({metadata_filter})" if clauses else metadata_filter)
+    return " && ".join(clauses) or None
+
+
+def rerank_by_recency(docs: List[Dict[str, Any]], half_life: float, k: int,
+                      weight: float = DEFAULT_RECENCY_WEIGHT,
+                      now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Re-rank retrieved documents by similarity blended with an exponential recency decay.
+
+    score = (1 - weight) * (1 - dist) + weight * 0.5 ** (age / half_life)
+
+    Documents without ``event_ts`` get no recency bonus. Each returned
+    document gets a ``recency_score`` entry.
+
+    Args:
+        docs: retrieve() results
+        half_life: Age in seconds at which the recency bonus halves
+        k: Number of documents to keep
+        weight: Share of the score given to recency
+        now: Reference time (default: current time)
+
+    Returns:
+        The k best documents, best first
+    """
+    now = time.time() if now is None else now
+    scored = []
+    for doc in docs:
+        event_ts = doc.get("metadata", {}).get("event_ts")
+        decay = 0.0
+        if event_ts is not None:
+            age = max(0.0, now - float(event_ts))
+            decay = math.pow(0.5, age / half_life)
+        score = (1.0 - weight) * (1.0 - doc.get("dist", 0.0)) + weight * decay
+        scored.append(dict(doc, recency_score=score))
+    scored.sort(key=lambda doc: doc["recency_score"], reverse=True)
+    return scored[:k]
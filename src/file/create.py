@@ -1,5 +1,8 @@
 import os
+import json
+import time
 import uuid
+import threading
 from datetime import datetime
 
 # ---------------------------
@@ -19,3 +22,82 @@ def save_text_to_file(text: str, live_directory: str):
         f.write(text.strip())
     
     return file_path
+
+
+# ---------------------------
+# Append-only JSONL caption segments
+# ---------------------------
+CAPTION_SEGMENT_MAX_BYTES = int(os.getenv("CAPTION_SEGMENT_MAX_BYTES", 256 * 1024))
+CAPTION_SEGMENT_MAX_SECONDS = float(os.getenv("CAPTION_SEGMENT_MAX_SECONDS", 300))
+
+
+class CaptionLog:
+    """
+    Append-only caption log split into size/time rotated JSONL segments.
+
+    Each caption becomes one line with structured fields (caption, timestamp,
+    click coordinates, session id, screenshot hashes) instead of one file per
+    click. Segments are named captions_<session>_<seq>.jsonl and a new one is
+    started once the current one exceeds max_bytes or max_seconds, which keeps
+    each file the Pathway connector has to re-read small.
+    """
+
+    def __init__(self, live_directory: str, session_id: str = None,
+                 max_bytes: int = CAPTION_SEGMENT_MAX_BYTES,
+                 max_seconds: float = CAPTION_SEGMENT_MAX_SECONDS):
+        self.live_directory = live_directory
+        self.session_id = session_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._segment_path = None
+        self._segment_started = 0.0
+        self._segment_bytes = 0
+        os.makedirs(live_directory, exist_ok=True)
+
+    def _rotate_if_needed(self, incoming: int):
+        now = time.monotonic()
+        if (self._segment_path is None
+                or self._segment_bytes + incoming > self.max_bytes
+                or now - self._segment_started > self.max_seconds):
+            self._sequence += 1
+            self._segment_path = os.path.join(
+                self.live_directory, f"captions_{self.session_id}_{self._sequence:05d}.jsonl")
+            self._segment_started = now
+            self._segment_bytes = 0
+
+    def append(self, caption: str, click_coords=None, screenshot_hashes=None, timestamp=None,
+               caption_id: str = None):
+        """
+        Append one caption record. Returns the path of the segment it went to.
+
+        Args:
+            caption: Caption text
+            click_coords: Optional (x, y) of the click
+            screenshot_hashes: Optional (before_hash, after_hash)
+            timestamp: Event time as epoch seconds (default: now)
+            caption_id: Optional id of the caption, unique within the session
+                (e.g. "click-12"), reported back in the document metadata
+        """
+        x, y = click_coords if click_coords else (None, None)
+        before_hash, after_hash = screenshot_hashes if screenshot_hashes else (None, None)
+        record = {
+            "caption": caption.strip(),
+            "timestamp": timestamp if timestamp is not None else time.time(),
+            "session_id": self.session_id,
+            "click_x": x,
+            "click_y": y,
+            "before_hash": before_hash,
+            "after_hash": after_hash,
+            "caption_id": caption_id,
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._lock:
+            self._rotate_if_needed(len(line))
+            # One write per record so readers never see half a line from us
+            with open(self._segment_path, "ab") as f:
+                f.write(line)
+            self._segment_bytes += len(line)
+            return self._segment_path
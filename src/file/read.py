@@ -0,0 +1,48 @@
+import os
+import threading
+from collections import OrderedDict
+
+# ---------------------------
+# Cached reads of context files
+# ---------------------------
+class FileContentCache:
+    """
+    LRU cache of text file contents keyed by (path, mtime, size).
+
+    A file that changes on disk gets a new key, so stale content is never
+    served; old versions simply age out of the cache.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read_text(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        with self._lock:
+            self._entries[key] = text
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+
+file_cache = FileContentCache()
+
+def read_text_cached(path):
+    """Read a text file through the shared content cache."""
+    return file_cache.read_text(path)
@@ -0,0 +1,118 @@
+import hashlib
+import numpy as np
+
+# ---------------------------
+# Fast before/after frame comparison
+# ---------------------------
+def qimage_to_array(image):
+    """Copy a QImage into an (H, W, 3) uint8 RGB numpy array."""
+    from PyQt5.QtGui import QImage
+
+    image = image.convertToFormat(QImage.Format_RGB32)
+    width, height = image.width(), image.height()
+    ptr = image.constBits()
+    ptr.setsize(image.byteCount())
+    # Rows may be padded, so reshape by bytesPerLine before cropping to width.
+    # Format_RGB32 is stored as BGRA on little-endian machines.
+    buf = np.frombuffer(ptr, np.uint8).reshape(height, image.bytesPerLine())
+    bgra = buf[:, :width * 4].reshape(height, width, 4)
+    return np.ascontiguousarray(bgra[..., 2::-1])
+
+
+def frame_hash(frame):
+    """Short content hash of an RGB frame, used to reference screenshots in caption records."""
+    return hashlib.blake2b(np.ascontiguousarray(frame).tobytes(), digest_size=8).hexdigest()
+
+
+def dhash(frame, hash_size=16):
+    """
+    Perceptual difference hash of an RGB frame.
+
+    Input: (H, W, 3) uint8 array
+           hash_size: the frame is averaged down to hash_size x (hash_size + 1)
+                      gray cells, giving hash_size**2 bits
+    Output: hex string; near-identical frames differ in few bits (see hamming_distance)
+    """
+    # A few samples per cell are enough for the cell means and much cheaper
+    step = max(1, min(frame.shape[0], frame.shape[1]) // (hash_size * 4))
+    frame = frame[::step, ::step]
+    gray = frame[..., 0] * 0.299 + frame[..., 1] * 0.587 + frame[..., 2] * 0.114
+    height, width = gray.shape
+    # Every cell needs at least one pixel for the block means below
+    if height < hash_size or width < hash_size + 1:
+        gray = np.repeat(np.repeat(gray, -(-hash_size // height), axis=0),
+                         -(-(hash_size + 1) // width), axis=1)
+        height, width = gray.shape
+    rows = np.arange(hash_size + 1) * height // hash_size
+    cols = np.arange(hash_size + 2) * width // (hash_size + 1)
+    sums = np.add.reduceat(np.add.reduceat(gray, rows[:-1], axis=0), cols[:-1], axis=1)
+    cells = sums / np.outer(np.diff(rows), np.diff(cols))
+    bits = cells[:, 1:] > cells[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two dhash() hex strings."""
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def frame_diff(before, after, pixel_threshold=16, stride=2):
+    """
+    Compare two RGB frames.
+
+    Input: before/after (H, W, 3) uint8 arrays
+           pixel_threshold: per-channel difference for a pixel to count as changed
+           stride: sample every n-th pixel in both directions (speed vs. precision)
+    Output: dict with
+        changed_fraction: share of sampled pixels that changed (0.0 - 1.0)
+        bbox: (x0, y0, x1, y1) of the changed area in full-resolution pixels,
+              x1/y1 exclusive, or None if nothing changed
+    """
+    if before.shape != after.shape:
+        height, width = after.shape[:2]
+        return {"changed_fraction": 1.0, "bbox": (0, 0, width, height)}
+
+    a = before[::stride, ::stride].astype(np.int16)
+    b = after[::stride, ::stride].astype(np.int16)
+    mask = (np.abs(a - b) > pixel_threshold).any(axis=2)
+
+    changed_fraction = float(mask.mean()) if mask.size else 0.0
+    if not changed_fraction:
+        return {"changed_fraction": 0.0, "bbox": None}
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    height, width = after.shape[:2]
+    bbox = (
+        int(cols[0]) * stride,
+        int(rows[0]) * stride,
+        min(width, (int(cols[-1]) + 1) * stride),
+        min(height, (int(rows[-1]) + 1) * stride),
+    )
+    return {"changed_fraction": changed_fraction, "bbox": bbox}
+
+
+class StabilityTracker:
+    """
+    Decides when a sequence of low-resolution frames has stopped changing.
+
+    update() is fed consecutive samples and returns True once `stable_frames`
+    consecutive pairs differ in less than `threshold` of their pixels.
+    """
+
+    def __init__(self, stable_frames=2, threshold=0.002, pixel_threshold=16):
+        self.stable_frames = stable_frames
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.previous = None
+        self.stable_count = 0
+
+    def update(self, frame):
+        if self.previous is not None:
+            diff = frame_diff(self.previous, frame, self.pixel_threshold, stride=1)
+            if diff["changed_fraction"] < self.threshold:
+                self.stable_count += 1
+            else:
+                self.stable_count = 0
+        self.previous = frame
+        return self.stable_count >= self.stable_frames
@@ -0,0 +1,45 @@
+import os
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+
+# ---------------------------
+# In-memory screenshot encoding
+# ---------------------------
+# format -> (Qt format name, mime type, file extension)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+def encode_image(image, fmt="png", quality=85):
+    """
+    Encode a QImage straight into memory. Safe to call from worker threads.
+
+    Input: image: QImage (not QPixmap, which must stay on the GUI thread)
+           fmt: "png", "webp" (lossless) or "jpeg"
+           quality: JPEG quality (0-100), ignored for the lossless formats
+    Output: (bytes, mime_type)
+    """
+    qt_format, mime_type, _ = IMAGE_FORMATS[fmt]
+    if fmt == "webp":
+        # Qt's WebP writer switches to lossless mode at quality 100
+        quality = 100
+    elif fmt == "png":
+        quality = -1
+
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    if not image.save(buffer, qt_format, quality):
+        raise ValueError(f"Could not encode screenshot as {fmt}")
+    buffer.close()
+    return bytes(data), mime_type
+
+
+def save_image_bytes(data, path):
+    """Write already encoded image bytes to disk."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
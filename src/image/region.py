@@ -0,0 +1,40 @@
+# ---------------------------
+# Caption focus region helpers
+# ---------------------------
+def focus_region(bbox, click_point, frame_size, click_radius=160, padding=24):
+    """
+    Union of the changed area and a window around the click point.
+
+    Input: bbox: (x0, y0, x1, y1) of changed pixels, or None
+           click_point: (x, y) in frame pixels, or None
+           frame_size: (width, height) of the frame
+           click_radius: half-size of the square kept around the click
+           padding: extra context added around the changed area
+    Output: (x0, y0, x1, y1) clamped to the frame, x1/y1 exclusive
+    """
+    width, height = frame_size
+    boxes = []
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        boxes.append((x0 - padding, y0 - padding, x1 + padding, y1 + padding))
+    if click_point is not None:
+        cx, cy = click_point
+        boxes.append((cx - click_radius, cy - click_radius, cx + click_radius, cy + click_radius))
+    if not boxes:
+        return (0, 0, width, height)
+
+    x0 = max(0, int(min(b[0] for b in boxes)))
+    y0 = max(0, int(min(b[1] for b in boxes)))
+    x1 = min(width, int(max(b[2] for b in boxes)))
+    y1 = min(height, int(max(b[3] for b in boxes)))
+    if x1 <= x0 or y1 <= y0:
+        return (0, 0, width, height)
+    return (x0, y0, x1, y1)
+
+
+def fit_within(width, height, max_side):
+    """Scale (width, height) down so that neither side exceeds max_side."""
+    if max_side <= 0 or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 import traceback
 from datetime import datetime
 from PyQt5.QtWidgets import (
@@ -8,15 +9,35 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import (
     Qt, pyqtSignal, QUrl, QTimer, QObject, pyqtSlot, QFile, QTextStream, 
-    QRunnable, QThreadPool
+    QRunnable, QThreadPool, QRect
 )
+from PyQt5.QtGui import QTextCursor
+from functools import partial
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineSettings
 from PyQt5.QtWebChannel import QWebChannel
 
-from src.file.create import save_text_to_file
-from src.agent.agent_utils import screenshot_to_text, get_user_response
-from src.client_functions.endpoints import answer, summarize, retrieve, list_documents, statistics, health_check, search_documents, ask_with_context
-from src.chat.manage import format_history, add_to_chat_history, chat_history
+from src.file.create import save_text_to_file, CaptionLog
+from src.file.read import read_text_cached
+from src.agent.agent_utils import (
+    screenshot_to_text, screenshots_to_text_batch, get_user_response, get_user_response_stream,
+    no_change_caption, restamp_caption, summarize_chat, embed_texts
+)
+from src.image.diff import qimage_to_array, frame_diff, frame_hash, StabilityTracker
+from src.image.region import focus_region, fit_within
+from src.image.encode import encode_image, save_image_bytes, IMAGE_FORMATS
+from src.pipeline.jobs import ClickJob, ClickQueue
+from src.pipeline.timing import spans, start_metrics_server
+from src.pipeline.log_buffer import LogBuffer
+from src.client_functions.endpoints import statistics, cache_stats
+from src.client_functions.async_endpoints import BackgroundAsyncClient
+from src.client_functions.endpoints import get_client as get_pathway_client
+from src.client_functions.endpoints import track_ingestion, ingestion_stats
+from src.client_functions.cache import index_version
+from src.client_functions.recency import window_start
+from src.chat.manage import add_to_chat_history, history
+from src.chat.memory import ChatTurnIndex
+from src.chat.prefetch import ChatPrefetch
+from src.agent.caption_memo import CaptionMemo
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,6 +49,102 @@ PATHWAY_DIR = os.path.join(ROOT_DIR, "pathway")
 os.makedirs(LIVE_DIR, exist_ok=True)
 API = os.getenv("GEMINI_API_KEY")
 K = int(os.getenv("K", 3))
+# Clicks whose before/after frames differ in less than this share of pixels
+# are not sent to the caption model. NO_CHANGE_POLICY: "note" or "drop".
+MIN_CHANGE_FRACTION = float(os.getenv("MIN_CHANGE_FRACTION", 0.002))
+DIFF_PIXEL_THRESHOLD = int(os.getenv("DIFF_PIXEL_THRESHOLD", 16))
+NO_CHANGE_POLICY = os.getenv("NO_CHANGE_POLICY", "note")
+# With CAPTION_CROP=1 only the changed area plus a window around the click is
+# sent to the caption model, scaled to at most CAPTION_MAX_SIDE pixels, plus an
+# optional low-resolution thumbnail of the full frame (0 disables it).
+CAPTION_CROP = os.getenv("CAPTION_CROP", "0") == "1"
+CAPTION_MAX_SIDE = int(os.getenv("CAPTION_MAX_SIDE", 1024))
+CLICK_CONTEXT_RADIUS = int(os.getenv("CLICK_CONTEXT_RADIUS", 160))
+CAPTION_THUMBNAIL_SIDE = int(os.getenv("CAPTION_THUMBNAIL_SIDE", 320))
+# Screenshots are encoded in worker threads straight into memory.
+# SCREENSHOT_FORMAT: png, webp (lossless) or jpeg (SCREENSHOT_QUALITY applies).
+# ARCHIVE_SCREENSHOTS=0 disables the background copies in game_screenshots.
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "png")
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", 85))
+ARCHIVE_SCREENSHOTS = os.getenv("ARCHIVE_SCREENSHOTS", "1") == "1"
+# AFTER_CAPTURE_MODE=fixed waits AFTER_CAPTURE_DELAY_MS before the "after" shot.
+# adaptive samples low-resolution frames every AFTER_SAMPLE_MS and takes the
+# shot once STABLE_FRAMES consecutive samples match, within AFTER_MIN_MS..AFTER_MAX_MS.
+AFTER_CAPTURE_MODE = os.getenv("AFTER_CAPTURE_MODE", "fixed")
+AFTER_CAPTURE_DELAY_MS = int(os.getenv("AFTER_CAPTURE_DELAY_MS", 500))
+AFTER_MIN_MS = int(os.getenv("AFTER_MIN_MS", 80))
+AFTER_MAX_MS = int(os.getenv("AFTER_MAX_MS", 2000))
+AFTER_SAMPLE_MS = int(os.getenv("AFTER_SAMPLE_MS", 50))
+STABLE_FRAMES = int(os.getenv("STABLE_FRAMES", 2))
+STABILITY_SAMPLE_WIDTH = 160
+# Every click becomes its own job. Captured jobs wait in a queue of
+# CLICK_QUEUE_SIZE and are captioned by at most CLICK_CONCURRENCY workers.
+# CLICK_QUEUE_POLICY when full: drop-oldest, coalesce or block.
+CLICK_QUEUE_SIZE = int(os.getenv("CLICK_QUEUE_SIZE", 8))
+CLICK_CONCURRENCY = int(os.getenv("CLICK_CONCURRENCY", 2))
+CLICK_QUEUE_POLICY = os.getenv("CLICK_QUEUE_POLICY", "drop-oldest")
+# When several clicks are queued, a worker captions up to CAPTION_BATCH_SIZE
+# of them in one multi-image request (1 disables batching).
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", 1))
+# Render chat answers token by token as they are generated
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "1") == "1"
+# CONTEXT_SOURCE=chunks uses the chunk text returned by /v1/retrieve, so the
+# client does not need the server's filesystem. files reads whole files
+# under PATHWAY_DIR through a (path, mtime, size) content cache (captions from
+# JSONL segments always use the row text).
+CONTEXT_SOURCE = os.getenv("CONTEXT_SOURCE", "chunks")
+# Number of older chat turns recalled by similarity to the current question,
+# on top of the recent turns and summary kept by the history manager (0 disables).
+CHAT_RECALL_K = int(os.getenv("CHAT_RECALL_K", 3))
+# Retrieval for chat can be limited to the last RETRIEVE_WINDOW_SECONDS of
+# events and re-ranked with a recency decay of RECENCY_HALF_LIFE seconds
+# (0 disables either).
+RETRIEVE_WINDOW_SECONDS = float(os.getenv("RETRIEVE_WINDOW_SECONDS", 0))
+RECENCY_HALF_LIFE = float(os.getenv("RECENCY_HALF_LIFE", 0))
+# CAPTION_SINK=jsonl appends captions to rotated JSONL segments in LIVE_DIR,
+# files writes one text_*.txt file per caption.
+CAPTION_SINK = os.getenv("CAPTION_SINK", "jsonl")
+# Every pipeline stage is timed per click/chat id. METRICS_PORT serves the
+# histograms and click queue counters at /metrics (Prometheus text) and the
+# spans at /trace (0 disables), TRACE_FILE gets a Chrome trace when the window closes.
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Written captions are followed until list_documents() shows them (one batched
+# poll for all pending captions, with backoff); the lag is the "index_visible"
+# stage. With CHAT_FRESH_WAIT_MS > 0 chat retrieval first waits up to that long
+# for captions still being indexed, so a question right after a click sees it
+# (off by default; TRACK_INGESTION=0 disables the tracking).
+TRACK_INGESTION = os.getenv("TRACK_INGESTION", "1") == "1"
+CHAT_FRESH_WAIT_MS = int(os.getenv("CHAT_FRESH_WAIT_MS", 0))
+# Captions are remembered in CAPTION_MEMO_PATH (SQLite, at most
+# CAPTION_MEMO_MAX_ENTRIES, least recently used evicted). A click whose before,
+# after and changed-region perceptual hashes are each within
+# CAPTION_MEMO_MAX_DISTANCE bits of a stored click, at about the same spot
+# (CAPTION_MEMO_BUCKET_PX grid), reuses its caption with a new event time
+# instead of calling the model (CAPTION_MEMO=0 disables).
+CAPTION_MEMO = os.getenv("CAPTION_MEMO", "1") == "1"
+CAPTION_MEMO_PATH = os.getenv("CAPTION_MEMO_PATH", os.path.join("cache", "caption_memo.sqlite3"))
+CAPTION_MEMO_MAX_ENTRIES = int(os.getenv("CAPTION_MEMO_MAX_ENTRIES", 5000))
+CAPTION_MEMO_MAX_DISTANCE = int(os.getenv("CAPTION_MEMO_MAX_DISTANCE", 8))
+CAPTION_MEMO_BUCKET_PX = int(os.getenv("CAPTION_MEMO_BUCKET_PX", 48))
+# log() only queues a record; the GUI thread shows queued records every
+# LOG_FLUSH_MS (at most LOG_FLUSH_MAX per tick) in a view capped at
+# LOG_VIEW_LINES lines. LOG_FILE gets every record as rotated JSON lines
+# (empty disables the file).
+LOG_FLUSH_MS = int(os.getenv("LOG_FLUSH_MS", 100))
+LOG_FLUSH_MAX = int(os.getenv("LOG_FLUSH_MAX", 500))
+LOG_VIEW_LINES = int(os.getenv("LOG_VIEW_LINES", 1000))
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("logs", "game_assistant.jsonl"))
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 5 * 1024 * 1024))
+# While the user types, the frame is grabbed and encoded and the draft is
+# retrieved PREFETCH_DEBOUNCE_MS after the last keystroke. On send the result
+# is reused if the message is at least PREFETCH_SIMILARITY alike and the index
+# has not changed; a prefetch still running is awaited up to PREFETCH_WAIT_MS.
+CHAT_PREFETCH = os.getenv("CHAT_PREFETCH", "1") == "1"
+PREFETCH_DEBOUNCE_MS = int(os.getenv("PREFETCH_DEBOUNCE_MS", 400))
+PREFETCH_MIN_CHARS = int(os.getenv("PREFETCH_MIN_CHARS", 8))
+PREFETCH_SIMILARITY = float(os.getenv("PREFETCH_SIMILARITY", 0.9))
+PREFETCH_WAIT_MS = int(os.getenv("PREFETCH_WAIT_MS", 1500))
 
 # -------------------- Worker Thread Infrastructure --------------------
 class WorkerSignals(QObject):
@@ -37,10 +154,12 @@ class WorkerSignals(QObject):
     - finished: No data
     - error: tuple (exctype, value, traceback.format_exc())
     - result: object data returned from processing
+    - progress: object partial data emitted while processing
     '''
     finished = pyqtSignal()
     error = pyqtSignal(tuple)
     result = pyqtSignal(object)
+    progress = pyqtSignal(object)
 
 class Worker(QRunnable):
     '''
@@ -83,16 +202,49 @@ class GameStreamApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.screenshot_counter = 0
+        self.chat_counter = 0
+        self.chat_key = None
         self.screenshots_dir = "game_screenshots"
         os.makedirs(self.screenshots_dir, exist_ok=True)
         
-        self.before_screenshot = None
-        self.click_coords = None
+        # Whether the current chat answer has started streaming into chat_text
+        self.chat_stream_started = False
+
+        history.summarizer = partial(summarize_chat, api_key=API)
+        self.chat_index = ChatTurnIndex(partial(embed_texts, api_key=API))
+        self.chat_prefetch = ChatPrefetch(min_similarity=PREFETCH_SIMILARITY)
+        self.caption_log = CaptionLog(LIVE_DIR) if CAPTION_SINK == "jsonl" else None
+        self.caption_memo = CaptionMemo(CAPTION_MEMO_PATH, CAPTION_MEMO_MAX_ENTRIES, CAPTION_MEMO_MAX_DISTANCE,
+                                        CAPTION_MEMO_BUCKET_PX) if CAPTION_MEMO else None
 
         # --- Initialize Thread Pool ---
         self.threadpool = QThreadPool()
+        self.click_queue = ClickQueue(CLICK_QUEUE_SIZE, CLICK_QUEUE_POLICY)
+        self.click_pool = QThreadPool()
+        self.click_pool.setMaxThreadCount(CLICK_CONCURRENCY)
+        # "block" waits for queue space here, not in the pool chat workers use;
+        # one thread keeps the clicks in order
+        self.enqueue_pool = QThreadPool()
+        self.enqueue_pool.setMaxThreadCount(1)
+        spans.add_gauges("click_queue", self.click_queue.stats)
+        self.metrics_server = start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+        # One event loop and connection pool for all concurrent chat retrievals
+        self.pathway_async = BackgroundAsyncClient()
+        get_pathway_client().ingestion.add_listener(
+            lambda key, path, written, seen: spans.record("index_visible", key, written, seen))
+        self.log_buffer = LogBuffer(log_file=LOG_FILE or None, max_bytes=LOG_FILE_MAX_BYTES)
+        self.log_dropped_shown = 0
         
         self.init_ui()
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.log_timer.start(LOG_FLUSH_MS)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(PREFETCH_DEBOUNCE_MS)
+        self.prefetch_timer.timeout.connect(self.start_chat_prefetch)
+        if CHAT_PREFETCH:
+            self.chat_input.textChanged.connect(self.prefetch_timer.start)
         self.log("Application started.")
         self.log(f"Multithreading with maximum {self.threadpool.maxThreadCount()} threads.")
 
@@ -118,6 +270,7 @@ class GameStreamApp(QMainWindow):
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
         self.log_text.setMaximumHeight(300)
+        self.log_text.document().setMaximumBlockCount(LOG_VIEW_LINES)
         left_layout.addWidget(log_label)
         left_layout.addWidget(self.log_text, 2)
         chat_label = QLabel("Chat:")
@@ -203,67 +356,270 @@ class GameStreamApp(QMainWindow):
         self.log("iFrame-aware bridge script injected successfully.")
 
     def handle_web_view_click(self, x, y):
-        self.log(f"SUCCESS: Click detected via JS Bridge at ({x}, {y}). Capturing 'before' screenshot.")
-        self.click_coords = (x, y)
-        self.capture_screenshot(self.on_before_screenshot_captured)
+        job = ClickJob(self.screenshot_counter, (x, y))
+        self.screenshot_counter += 1
+        self.log(f"SUCCESS: Click {job.id} detected via JS Bridge at ({x}, {y}). Capturing 'before' screenshot.")
+        self.capture_screenshot(partial(self.on_before_screenshot_captured, job), f"click-{job.id}")
     
-    def capture_screenshot(self, callback):
-        pixmap = self.web_view.grab()
+    def capture_screenshot(self, callback, key=None):
+        with spans.span("grab", key):
+            pixmap = self.web_view.grab()
         callback(pixmap)
 
-    def on_before_screenshot_captured(self, before_pixmap):
+    def on_before_screenshot_captured(self, job, before_pixmap):
         if before_pixmap.isNull():
-            self.log("ERROR: 'Before' screenshot is empty! Cannot proceed.")
+            self.log(f"ERROR: 'Before' screenshot of click {job.id} is empty! Cannot proceed.")
             return
         
-        self.log("'Before' screenshot captured. Executing JS click and waiting for render.")
-        self.before_screenshot = before_pixmap
-        x, y = self.click_coords
+        self.log(f"'Before' screenshot of click {job.id} captured. Executing JS click and waiting for render.")
+        # QImage (unlike QPixmap) may be used from worker threads
+        job.before_image = before_pixmap.toImage()
+        job.before_at = time.time()
+        x, y = job.click_coords
         js_click_code = f"document.elementFromPoint({x}, {y}).click();"
         self.web_view.page().runJavaScript(js_click_code)
-        QTimer.singleShot(500, self.take_after_screenshot)
-
-    def take_after_screenshot(self):
-        self.log("Capturing 'after' screenshot.")
-        self.capture_screenshot(self.on_after_screenshot_captured)
+        job.after_capture_started = time.perf_counter()
+        if AFTER_CAPTURE_MODE == "adaptive":
+            job.stability = StabilityTracker(stable_frames=STABLE_FRAMES)
+            QTimer.singleShot(AFTER_MIN_MS, partial(self.sample_after_frame, job))
+        else:
+            QTimer.singleShot(AFTER_CAPTURE_DELAY_MS, partial(self.take_after_screenshot, job))
+
+    def take_after_screenshot(self, job):
+        self.log(f"Capturing 'after' screenshot of click {job.id}.")
+        job.after_delay_ms = AFTER_CAPTURE_DELAY_MS
+        spans.record("after_wait", f"click-{job.id}", job.after_capture_started, time.perf_counter())
+        self.capture_screenshot(partial(self.on_after_screenshot_captured, job), f"click-{job.id}")
+
+    def sample_after_frame(self, job):
+        """Adaptive mode: grab a frame and use it as 'after' once rendering has settled."""
+        with spans.span("grab", f"click-{job.id}"):
+            pixmap = self.web_view.grab()
+        now = time.perf_counter()
+        elapsed_ms = (now - job.after_capture_started) * 1000
+        if pixmap.isNull():
+            # Nothing to compare; take the 'after' frame at the fixed delay instead
+            self.log(f"WARNING: Empty frame while waiting for click {job.id} to render, "
+                     f"falling back to the fixed {AFTER_CAPTURE_DELAY_MS} ms delay.")
+            job.stability = None
+            QTimer.singleShot(max(0, int(AFTER_CAPTURE_DELAY_MS - elapsed_ms)),
+                              partial(self.take_after_screenshot, job))
+            return
+        small = pixmap.toImage().scaledToWidth(STABILITY_SAMPLE_WIDTH, Qt.FastTransformation)
+        stable = job.stability.update(qimage_to_array(small))
+        if stable or elapsed_ms >= AFTER_MAX_MS:
+            reason = "stable" if stable else "max wait reached"
+            job.after_delay_ms = elapsed_ms
+            job.stability = None
+            spans.record("after_wait", f"click-{job.id}", job.after_capture_started, now)
+            self.log(f"Capturing 'after' screenshot of click {job.id} after {elapsed_ms:.0f} ms ({reason}).")
+            self.on_after_screenshot_captured(job, pixmap)
+        else:
+            QTimer.singleShot(AFTER_SAMPLE_MS, partial(self.sample_after_frame, job))
 
-    def on_after_screenshot_captured(self, after_pixmap):
+    def on_after_screenshot_captured(self, job, after_pixmap):
         if after_pixmap.isNull():
-            self.log("ERROR: 'After' screenshot is empty!")
+            self.log(f"ERROR: 'After' screenshot of click {job.id} is empty!")
             return
-        self.log("Both screenshots ready. Saving and processing in background.")
-        self.save_and_process_click_screenshots(self.before_screenshot, after_pixmap)
-        self.before_screenshot = None
-        self.click_coords = None
-
-    def save_and_process_click_screenshots(self, before_pixmap, after_pixmap):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        before_path = os.path.join(self.screenshots_dir, f"click_{self.screenshot_counter}_before_{timestamp}.png")
-        after_path = os.path.join(self.screenshots_dir, f"click_{self.screenshot_counter}_after_{timestamp}.png")
-        
-        if not before_pixmap.save(before_path, "PNG"):
-            self.log(f"ERROR: Failed to save 'before' screenshot.")
-            return
-        if not after_pixmap.save(after_path, "PNG"):
-            self.log(f"ERROR: Failed to save 'after' screenshot.")
-            return
-            
-        self.log(f"SUCCESS: Saved screenshots for click {self.screenshot_counter}.")
-        self.screenshot_counter += 1
+        job.after_image = after_pixmap.toImage()
+        job.after_at = time.time()
+        self.log(f"Both screenshots of click {job.id} ready. Queued for processing.")
+        if CLICK_QUEUE_POLICY == "block":
+            # Waiting for a free slot must not freeze the GUI
+            worker = Worker(self.enqueue_click_job, job)
+            worker.signals.result.connect(self.on_click_jobs_dropped)
+            worker.signals.error.connect(self.on_click_error)
+            self.enqueue_pool.start(worker)
+        else:
+            self.on_click_jobs_dropped(self.enqueue_click_job(job))
 
-        worker = Worker(self._process_click_task, before_path, after_path)
+    def enqueue_click_job(self, job):
+        """Put a captured job in the click queue and start a worker for it."""
+        dropped = self.click_queue.put(job)
+        worker = Worker(self._process_next_click_job)
         worker.signals.result.connect(self.on_click_processing_finished)
-        self.threadpool.start(worker)
-
-    def _process_click_task(self, before_path, after_path):
-        caption = screenshot_to_text([before_path, after_path], API)
-        file_path = save_text_to_file(caption, LIVE_DIR)
-        return caption, file_path
+        worker.signals.error.connect(self.on_click_error)
+        self.click_pool.start(worker)
+        return dropped
+
+    def on_click_jobs_dropped(self, dropped):
+        for job in dropped:
+            self.log(f"WARNING: Click queue full, dropped click {job.id}.")
+
+    def _process_next_click_job(self):
+        jobs = self.click_queue.get_batch(max(1, CAPTION_BATCH_SIZE))
+        if not jobs:
+            # Jobs were coalesced, dropped or batched before this worker ran
+            return None
 
-    def on_click_processing_finished(self, result):
-        caption, file_path = result
-        self.log(f"Caption generated: '{caption[:30]}...'")
-        self.log(f"New file created for caption: {file_path}")
+        results, pending = [], []
+        for job in jobs:
+            request = self._prepare_caption_request(job.before_image, job.after_image,
+                                                    job.click_coords, job.id,
+                                                    datetime.fromtimestamp(job.after_at))
+            if request is None:
+                results.append((job, None, None))
+            elif "caption" in request:
+                file_path = self.save_caption(request["caption"], job.click_coords, request["hashes"],
+                                              job.after_at, key=f"click-{job.id}")
+                results.append((job, request["caption"], file_path))
+            else:
+                request["event_time"] = datetime.fromtimestamp(job.after_at)
+                pending.append((job, request))
+
+        start = time.perf_counter()
+        captions = None
+        if len(pending) > 1:
+            try:
+                captions = screenshots_to_text_batch([request for _, request in pending], API)
+            except Exception as e:
+                self.log(f"WARNING: Batch caption call for {len(pending)} clicks failed ({e}), "
+                         f"captioning them one at a time.")
+        if captions is None:
+            captions = []
+            for job, request in pending:
+                try:
+                    captions.append(screenshot_to_text(request["images"], API, request["focus"],
+                                                       request["event_time"]))
+                except Exception as e:
+                    # One failed call must not take the other clicks of the batch with it
+                    self.log(f"ERROR: Captioning click {job.id} failed: {e}")
+                    captions.append(None)
+        end = time.perf_counter()
+        for (job, request), caption in zip(pending, captions):
+            if caption is None:
+                continue
+            spans.record("caption_llm", f"click-{job.id}", start, end, batch=len(pending))
+            self.remember_caption(request, caption)
+            file_path = self.save_caption(caption, job.click_coords, request["hashes"], job.after_at,
+                                          key=f"click-{job.id}")
+            results.append((job, caption, file_path))
+        return results
+
+    def archive_screenshots(self, images, key=None):
+        """
+        Write (image, path) pairs to game_screenshots in the background.
+        Images are QImages, encoded there, or already encoded (bytes, mime_type).
+        """
+        def _write():
+            with spans.span("archive", key):
+                for image, path in images:
+                    data = image[0] if isinstance(image, tuple) else self._encode(image)[0]
+                    save_image_bytes(data, path)
+        self.threadpool.start(Worker(_write))
+
+    def _encode(self, image):
+        return encode_image(image, SCREENSHOT_FORMAT, SCREENSHOT_QUALITY)
+
+    def _caption_images(self, before_image, after_image, bbox, click_coords):
+        """Encode the focus-region crops (and thumbnail) that are sent to the caption model."""
+        # Click coordinates are in CSS pixels, the grabbed frames in device pixels
+        ratio = after_image.devicePixelRatio()
+        click_point = (click_coords[0] * ratio, click_coords[1] * ratio) if click_coords else None
+        x0, y0, x1, y1 = focus_region(bbox, click_point, (after_image.width(), after_image.height()),
+                                      click_radius=CLICK_CONTEXT_RADIUS * ratio)
+        crop_size = fit_within(x1 - x0, y1 - y0, CAPTION_MAX_SIDE)
+
+        images = []
+        for image in (before_image, after_image):
+            crop = image.copy(QRect(x0, y0, x1 - x0, y1 - y0))
+            if (crop.width(), crop.height()) != crop_size:
+                crop = crop.scaled(*crop_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            images.append(self._encode(crop))
+
+        if CAPTION_THUMBNAIL_SIDE > 0:
+            thumb_size = fit_within(after_image.width(), after_image.height(), CAPTION_THUMBNAIL_SIDE)
+            thumb = after_image.scaled(*thumb_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            images.append(self._encode(thumb))
+
+        return images, {"region": (x0, y0, x1, y1), "click": click_point}
+
+    def _prepare_caption_request(self, before_image, after_image, click_coords, counter, event_time=None):
+        """
+        Diff, archive and encode one click.
+        Returns None to drop it, {"caption": ...} for a no-change note or a
+        memoized caption, or {"images": ..., "focus": ...} for the caption model.
+        """
+        key = f"click-{counter}"
+        with spans.span("diff", key):
+            before, after = qimage_to_array(before_image), qimage_to_array(after_image)
+            diff = frame_diff(before, after, pixel_threshold=DIFF_PIXEL_THRESHOLD)
+            hashes = (frame_hash(before), frame_hash(after))
+        # Uncropped caption images are the full frames, encoded once for the archive too
+        frames = None
+        if ARCHIVE_SCREENSHOTS:
+            if not CAPTION_CROP:
+                with spans.span("encode", key):
+                    frames = [self._encode(before_image), self._encode(after_image)]
+            self._archive_click(frames or (before_image, after_image), counter, event_time)
+
+        if diff["changed_fraction"] < MIN_CHANGE_FRACTION:
+            if NO_CHANGE_POLICY != "note":
+                return None
+            return {"caption": no_change_caption(click_coords, event_time), "hashes": hashes}
+
+        memo_key = None
+        if self.caption_memo is not None:
+            with spans.span("caption_memo", key):
+                memo_key = self.caption_memo.make_key(before, after, diff["bbox"], click_coords)
+                caption = self.caption_memo.lookup(memo_key)
+            if caption is not None:
+                stats = self.caption_memo.stats()
+                self.log(f"Click {counter} repeats a known transition, reusing its caption "
+                         f"(memo hit rate {stats['hit_rate']:.0%} of {stats['hits'] + stats['misses']}).")
+                return {"caption": restamp_caption(caption, event_time), "hashes": hashes}
+
+        with spans.span("encode", key):
+            if CAPTION_CROP:
+                images, focus = self._caption_images(before_image, after_image, diff["bbox"], click_coords)
+            else:
+                images, focus = frames or [self._encode(before_image), self._encode(after_image)], None
+        return {"images": images, "focus": focus, "hashes": hashes, "memo_key": memo_key}
+
+    def _archive_click(self, frames, counter, event_time=None):
+        """Archive the before/after frames of a click, named by the time of the click."""
+        timestamp = (event_time or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        ext = IMAGE_FORMATS[SCREENSHOT_FORMAT][2]
+        before_data, after_data = frames
+        self.archive_screenshots([
+            (before_data, os.path.join(self.screenshots_dir, f"click_{counter}_before_{timestamp}.{ext}")),
+            (after_data, os.path.join(self.screenshots_dir, f"click_{counter}_after_{timestamp}.{ext}")),
+        ], key=f"click-{counter}")
+
+    def remember_caption(self, request, caption):
+        """Store a model caption in the caption memo."""
+        if request.get("memo_key") is not None and caption:
+            self.caption_memo.store(request["memo_key"], caption)
+
+    def save_caption(self, caption, click_coords=None, hashes=None, timestamp=None, key=None):
+        """Write a caption to LIVE_DIR for indexing. Returns the file it went to."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with spans.span("caption_write", key):
+            if self.caption_log is None:
+                file_path = save_text_to_file(caption, LIVE_DIR)
+            else:
+                file_path = self.caption_log.append(caption, click_coords, hashes, timestamp, caption_id=key)
+        if TRACK_INGESTION:
+            # JSONL segments hold many captions; their rows are told apart by caption_id
+            track_ingestion(file_path, key if self.caption_log is not None else None, key)
+        return file_path
+
+    def on_click_processing_finished(self, results):
+        if not results:
+            return
+        if len(results) > 1:
+            self.log(f"Captioned {len(results)} clicks in one batch.")
+        for job, caption, file_path in results:
+            if caption is None:
+                self.log(f"No visual change after click {job.id}. Dropped without caption.")
+                continue
+            if job.coalesced_ids:
+                self.log(f"Click {job.id} includes coalesced clicks {job.coalesced_ids}.")
+            self.log(f"Caption generated: '{caption[:30]}...'")
+            self.log(f"New file created for caption: {file_path}")
+
+    def on_click_error(self, error_tuple):
+        self.log(f"ERROR in click worker: {error_tuple[1]}")
 
     # --- Chat logic ---
     def send_chat(self):
@@ -279,70 +635,202 @@ class GameStreamApp(QMainWindow):
         self.chat_text.append(f"[{timestamp}] You: {msg}")
         self.chat_text.append(f"[{timestamp}] AI: Thinking...")
         self.chat_input.clear()
+        self.prefetch_timer.stop()
 
-        pixmap = self.web_view.grab()
-        screenshot_path = self.save_chat_screenshot(pixmap)
+        self.chat_counter += 1
+        self.chat_key = f"chat-{self.chat_counter}"
+        with spans.span("grab", self.chat_key):
+            pixmap = self.web_view.grab()
+        if pixmap.isNull():
+            self.log("ERROR: Captured pixmap for chat context is empty.")
+            image = None
+        else:
+            image = pixmap.toImage()
         
-        worker = Worker(self._process_chat_task, msg, screenshot_path)
+        self.chat_stream_started = False
+        worker = Worker(self._process_chat_task, msg, image, key=self.chat_key)
+        if CHAT_STREAMING:
+            worker.kwargs["progress_callback"] = worker.signals.progress.emit
+            worker.signals.progress.connect(self.on_chat_chunk_received)
         worker.signals.result.connect(self.on_chat_response_received)
         worker.signals.finished.connect(self.enable_chat_ui)
         worker.signals.error.connect(self.on_chat_error)
         self.threadpool.start(worker)
     
-    def save_chat_screenshot(self, pixmap):
-        if pixmap.isNull():
-            self.log("ERROR: Captured pixmap for chat context is empty.")
-            return None
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"chat_context_{timestamp}.png"
-        path = os.path.join(self.screenshots_dir, filename)
-        
-        if pixmap.save(path, "PNG"):
-            screenshot_path = os.path.abspath(path)
-            self.log(f"SUCCESS: Chat context screenshot saved to: {screenshot_path}")
-            return screenshot_path
+    def start_chat_prefetch(self):
+        """Debounced: grab the frame and start retrieval for the current draft."""
+        draft = self.chat_input.toPlainText().strip()
+        if len(draft) < PREFETCH_MIN_CHARS or not self.chat_input.isEnabled():
+            return
+        with spans.span("grab", "prefetch"):
+            pixmap = self.web_view.grab()
+        image = None if pixmap.isNull() else pixmap.toImage()
+        entry = self.chat_prefetch.start(draft, self._chat_queries(draft))
+        self.threadpool.start(Worker(self._prefetch_task, entry, image))
+
+    def _prefetch_task(self, entry, image):
+        try:
+            screenshot = digest = None
+            if image is not None:
+                with spans.span("encode", "prefetch"):
+                    screenshot = self._encode(image)
+                    digest = frame_hash(qimage_to_array(image))
+            with spans.span("retrieve", "prefetch", queries=len(entry.queries)):
+                results = self._retrieve_context(entry.queries)
+            entry.finish(results, get_pathway_client().retrieval_cache.version, screenshot, digest)
+        except Exception as e:
+            entry.finish(error=e)
+
+    def _chat_queries(self, user_msg):
+        queries = [user_msg]
+        last = history.last_turn()
+        if last:
+            # Follow-up questions often only make sense together with the previous one
+            queries.append(f"{last['user']} {user_msg}")
+        return queries
+
+    def _retrieve_context(self, queries):
+        since = window_start(RETRIEVE_WINDOW_SECONDS) if RETRIEVE_WINDOW_SECONDS > 0 else None
+        return self.pathway_async.retrieve_many(queries, k=K, use_cache=True, since=since,
+                                                recency_half_life=RECENCY_HALF_LIFE or None)
+
+    def _current_index_version(self):
+        cache = get_pathway_client().retrieval_cache
+        if cache.needs_version_check():
+            cache.update_version(index_version(statistics()))
+        return cache.version
+
+    def _process_chat_task(self, user_msg, image, progress_callback=None, key=None):
+        queries = self._chat_queries(user_msg)
+        if TRACK_INGESTION and CHAT_FRESH_WAIT_MS > 0:
+            # Read-your-writes: captions of the last clicks should be searchable
+            with spans.span("fresh_wait", key):
+                fresh = get_pathway_client().wait_fresh(CHAT_FRESH_WAIT_MS)
+            if not fresh:
+                self.log(f"WARNING: Captions still being indexed after {CHAT_FRESH_WAIT_MS}ms; "
+                         f"the newest clicks may be missing from the context.")
+        prefetched = None
+        if CHAT_PREFETCH:
+            try:
+                prefetched = self.chat_prefetch.match(user_msg, queries[1:], self._current_index_version(),
+                                                      wait=PREFETCH_WAIT_MS / 1000)
+            except Exception as e:
+                self.log(f"WARNING: Prefetch check failed: {e}")
+            self.chat_prefetch.clear()
+
+        screenshot = None
+        if image is not None:
+            with spans.span("encode", key):
+                if (prefetched is not None and prefetched.screenshot is not None
+                        and frame_hash(qimage_to_array(image)) == prefetched.frame_hash):
+                    screenshot = prefetched.screenshot
+                else:
+                    screenshot = self._encode(image)
+            if ARCHIVE_SCREENSHOTS:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                ext = IMAGE_FORMATS[SCREENSHOT_FORMAT][2]
+                path = os.path.join(self.screenshots_dir, f"chat_context_{timestamp}.{ext}")
+                self.threadpool.start(Worker(save_image_bytes, screenshot[0], path))
+
+        if prefetched is not None:
+            ret_res = prefetched.results
+            self.log(f"BACKGROUND: Reusing retrieval prefetched for draft '{prefetched.draft[:30]}'.")
         else:
-            self.log("ERROR: Failed to save chat context screenshot.")
-            return None
-            
-    def _process_chat_task(self, user_msg, screenshot_path):
-        self.log("BACKGROUND: Retrieving files from Pathway...")
-        ret_res = retrieve(user_msg, k=K)
-        self.log(f"BACKGROUND: Retrieved top {K} Files.")
+            self.log("BACKGROUND: Retrieving files from Pathway...")
+            with spans.span("retrieve", key, queries=len(queries)):
+                ret_res = self._retrieve_context(queries)
+        self.log(f"BACKGROUND: Retrieved {len(ret_res)} Files for {len(queries)} queries.")
+        stats = cache_stats()
+        self.log(f"Retrieval cache: {stats['hits']} hits / {stats['misses']} misses, "
+                 f"saved {stats['saved_seconds']:.2f}s")
+        if TRACK_INGESTION:
+            ingestion = ingestion_stats()
+            self.log(f"Ingestion: {ingestion['pending']} pending, lag p50={ingestion['lag']['p50'] * 1000:.0f}ms "
+                     f"p99={ingestion['lag']['p99'] * 1000:.0f}ms, {ingestion['timed_out']} timed out")
         
-        list_of_paths = [os.path.join(PATHWAY_DIR, ret["metadata"]["path"]) for ret in ret_res]
-        self.log(f"Retrieves: {list_of_paths}")
-        formatted_chat_history = format_history(chat_history)
+        self.log(f"Retrieves: {[ret['metadata'].get('path') for ret in ret_res]}")
+        with spans.span("context_load", key):
+            if CONTEXT_SOURCE == "files":
+                # A JSONL segment holds many captions; its row text is the caption itself
+                context_chunks = [ret["text"] if ret["metadata"]["path"].endswith(".jsonl")
+                                  else read_text_cached(os.path.join(PATHWAY_DIR, ret["metadata"]["path"]))
+                                  for ret in ret_res]
+            else:
+                context_chunks = [ret["text"] for ret in ret_res]
+        formatted_chat_history = history.format()
+        if CHAT_RECALL_K > 0 and len(self.chat_index) > 0:
+            try:
+                recalled = self.chat_index.search(user_msg, k=CHAT_RECALL_K,
+                                                  before=len(history) - history.recent_count())
+            except Exception as e:
+                self.log(f"WARNING: Chat recall failed: {e}")
+                recalled = []
+            if recalled:
+                formatted_chat_history = ("Relevant earlier exchanges:\n" + "\n".join(recalled)
+                                          + "\n\n" + formatted_chat_history)
         
         self.log("BACKGROUND: Generating response from LLM...")
-        ai_response = get_user_response(user_msg, formatted_chat_history, screenshot_path, list_of_paths, API)
+        start = time.perf_counter()
+        if progress_callback is None:
+            ai_response = get_user_response(user_msg, formatted_chat_history, screenshot, context_chunks, API)
+        else:
+            parts = []
+            for text in get_user_response_stream(user_msg, formatted_chat_history, screenshot, context_chunks, API):
+                if not parts:
+                    spans.record("answer_first_token", key, start, time.perf_counter())
+                parts.append(text)
+                progress_callback(text)
+            ai_response = "".join(parts)
+        spans.record("answer_llm", key, start, time.perf_counter())
         
-        add_to_chat_history(user_msg, ai_response)
+        turn = add_to_chat_history(user_msg, ai_response)
+        if CHAT_RECALL_K > 0:
+            # Embedding the turn is not on the response path
+            self.threadpool.start(Worker(self.chat_index.add, user_msg, ai_response, turn))
         
         return ai_response
 
-    def on_chat_response_received(self, ai_response):
-        self.log("Response generated by LLM.")
-    
+    def remove_thinking_line(self):
         cursor = self.chat_text.textCursor()
         cursor.movePosition(cursor.End)
         cursor.select(cursor.LineUnderCursor)
         cursor.removeSelectedText()
         cursor.deletePreviousChar()
         self.chat_text.setTextCursor(cursor)
-        
-        timestamp = datetime.now().strftime("%H:%M%S")
-        self.chat_text.append(f"[{timestamp}] AI: {ai_response}")
-    
-    def on_chat_error(self, error_tuple):
-        self.log(f"ERROR in chat worker: {error_tuple[1]}")
+
+    def on_chat_chunk_received(self, text):
+        with spans.span("ui_render", self.chat_key):
+            self._render_chat_chunk(text)
+
+    def _render_chat_chunk(self, text):
+        if not self.chat_stream_started:
+            self.chat_stream_started = True
+            self.log("First response tokens received from LLM.")
+            self.remove_thinking_line()
+            timestamp = datetime.now().strftime("%H:%M%S")
+            self.chat_text.append(f"[{timestamp}] AI: ")
         cursor = self.chat_text.textCursor()
         cursor.movePosition(cursor.End)
-        cursor.select(cursor.LineUnderCursor)
-        cursor.removeSelectedText()
-        cursor.deletePreviousChar()
+        cursor.insertText(text)
         self.chat_text.setTextCursor(cursor)
+        self.chat_text.ensureCursorVisible()
+
+    def on_chat_response_received(self, ai_response):
+        self.log("Response generated by LLM.")
+        if self.chat_stream_started:
+            # Already rendered chunk by chunk
+            return
+    
+        with spans.span("ui_render", self.chat_key):
+            self.remove_thinking_line()
+            
+            timestamp = datetime.now().strftime("%H:%M%S")
+            self.chat_text.append(f"[{timestamp}] AI: {ai_response}")
+    
+    def on_chat_error(self, error_tuple):
+        self.log(f"ERROR in chat worker: {error_tuple[1]}")
+        if not self.chat_stream_started:
+            self.remove_thinking_line()
         timestamp = datetime.now().strftime("%H:%M%S")
         self.chat_text.append(f"[{timestamp}] AI: Sorry, an error occurred.")
 
@@ -353,12 +841,55 @@ class GameStreamApp(QMainWindow):
         self.chat_input.setFocus()
         self.log("Chat UI re-enabled.")
 
+    def closeEvent(self, event):
+        for stage, stats in spans.summary().items():
+            self.log(f"Timing {stage}: n={stats['count']} p50={stats['p50'] * 1000:.0f}ms "
+                     f"p99={stats['p99'] * 1000:.0f}ms max={stats['max'] * 1000:.0f}ms")
+        if TRACE_FILE:
+            spans.write_chrome_trace(TRACE_FILE)
+            self.log(f"Chrome trace written to {TRACE_FILE}")
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        if TRACK_INGESTION:
+            ingestion = ingestion_stats()
+            self.log(f"Ingestion: {ingestion['visible']}/{ingestion['tracked']} captions indexed, "
+                     f"{ingestion['timed_out']} timed out, {ingestion['polls']} polls")
+        get_pathway_client().ingestion.close()
+        self.pathway_async.close()
+        if self.caption_memo is not None:
+            memo = self.caption_memo.stats()
+            self.log(f"Caption memo: {memo['hits']} hits / {memo['misses']} misses "
+                     f"({memo['hit_rate']:.0%}), {memo['entries']} entries, {memo['evictions']} evicted")
+            self.caption_memo.close()
+        self.log_timer.stop()
+        self.flush_logs(max_items=None)
+        self.log_buffer.close()
+        super().closeEvent(event)
+
     # --- Logging ---
     def log(self, msg):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"[{timestamp}] {msg}")
-        print(f"[{timestamp}] {msg}")
-        QApplication.processEvents()
+        """Queue a log line. Safe to call from worker threads; shown by flush_logs."""
+        self.log_buffer.push(msg)
+
+    def flush_logs(self, max_items=LOG_FLUSH_MAX):
+        """GUI thread: move queued log records into the view and stdout in one batch."""
+        records = self.log_buffer.drain(max_items)
+        if self.log_buffer.dropped > self.log_dropped_shown:
+            records.append((time.time(), "WARNING", "", f"WARNING: {self.log_buffer.dropped - self.log_dropped_shown} "
+                                                         f"log lines dropped from the view (still in the log file)."))
+            self.log_dropped_shown = self.log_buffer.dropped
+        if not records:
+            return
+        text = "\n".join(f"[{datetime.fromtimestamp(ts).strftime('%H:%M:%S')}] {msg}"
+                         for ts, _, _, msg in records)
+        cursor = self.log_text.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        if not self.log_text.document().isEmpty():
+            text = "\n" + text
+        cursor.insertText(text)
+        self.log_text.setTextCursor(cursor)
+        self.log_text.ensureCursorVisible()
+        print(text.lstrip("\n"))
 
 
 def main():
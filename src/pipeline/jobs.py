@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+
+# ---------------------------
+# Per-click pipeline jobs
+# ---------------------------
+class ClickJob:
+    """State of one click travelling through capture -> caption -> index."""
+
+    def __init__(self, job_id, click_coords):
+        self.id = job_id
+        self.click_coords = click_coords
+        self.before_image = None
+        self.after_image = None
+        self.clicked_at = time.time()
+        self.before_at = None
+        self.after_at = None
+        # Adaptive "after" capture state
+        self.after_capture_started = None
+        self.after_delay_ms = None
+        self.stability = None
+        # Ids of later clicks folded into this job by the "coalesce" policy
+        self.coalesced_ids = []
+
+    def __repr__(self):
+        return f"ClickJob(id={self.id}, click={self.click_coords})"
+
+
+class ClickQueue:
+    """
+    Bounded, thread-safe FIFO of captured click jobs.
+
+    When the queue is full, put() applies the backpressure policy:
+    - "drop-oldest": evict the oldest pending job
+    - "coalesce": fold the new job into the newest pending one, keeping its
+      'before' frame and taking the new 'after' frame and click position
+    - "block": wait until a consumer frees a slot (call off the GUI thread)
+    """
+
+    POLICIES = ("drop-oldest", "coalesce", "block")
+
+    def __init__(self, max_size=8, policy="drop-oldest"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown click queue policy: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self.submitted = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, job, timeout=None):
+        """
+        Enqueue a job. Returns the list of jobs evicted to make room.
+
+        Raises:
+            TimeoutError: if the "block" policy waited longer than timeout
+        """
+        evicted = []
+        with self._cond:
+            self.submitted += 1
+            if len(self._jobs) >= self.max_size:
+                if self.policy == "drop-oldest":
+                    evicted.append(self._jobs.popleft())
+                    self.dropped += 1
+                elif self.policy == "coalesce":
+                    newest = self._jobs[-1]
+                    newest.after_image = job.after_image
+                    newest.after_at = job.after_at
+                    newest.click_coords = job.click_coords
+                    newest.coalesced_ids.append(job.id)
+                    self.coalesced += 1
+                    return evicted
+                elif not self._cond.wait_for(lambda: len(self._jobs) < self.max_size, timeout):
+                    raise TimeoutError("Click queue is full")
+            self._jobs.append(job)
+            self._cond.notify_all()
+        return evicted
+
+    def get_batch(self, max_jobs):
+        """Pop up to max_jobs pending jobs without waiting."""
+        with self._cond:
+            jobs = [self._jobs.popleft() for _ in range(min(max_jobs, len(self._jobs)))]
+            if jobs:
+                self._cond.notify_all()
+            return jobs
+
+    def __len__(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._jobs),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+            }
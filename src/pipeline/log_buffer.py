@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+# ---------------------------
+# Structured log file
+# ---------------------------
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, thread, msg and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# ---------------------------
+# Thread-safe log buffer for the GUI
+# ---------------------------
+class LogBuffer:
+    """
+    Log records pushed from any thread, drained in batches by the GUI thread.
+
+    push() only appends to a bounded deque (atomic in CPython, no lock) and
+    hands the record to a QueueHandler; the rotating JSONL file is written by
+    a QueueListener thread. When the GUI falls behind, the oldest unshown
+    records are dropped from the view (never from the file) and counted.
+    """
+
+    def __init__(self, max_records=5000, log_file=None, max_bytes=5 * 1024 * 1024,
+                 backup_count=3, name="game_assistant"):
+        self._records = deque(maxlen=max_records)
+        # Approximate under contention, it only feeds a warning line
+        self.dropped = 0
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self._listener = None
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                               backupCount=backup_count, encoding="utf-8")
+            file_handler.setFormatter(JsonLineFormatter())
+            log_queue = queue.SimpleQueue()
+            self.logger.addHandler(QueueHandler(log_queue))
+            self._listener = QueueListener(log_queue, file_handler)
+            self._listener.start()
+
+    def push(self, msg, level=None, **fields):
+        """Record a message. Safe to call from worker threads."""
+        if level is None:
+            level = "ERROR" if msg.startswith(("ERROR", "FATAL")) else (
+                "WARNING" if msg.startswith("WARNING") else "INFO")
+        if len(self._records) == self._records.maxlen:
+            self.dropped += 1
+        self._records.append((time.time(), level, threading.current_thread().name, msg))
+        if self._listener is not None:
+            self.logger.log(getattr(logging, level), msg, extra={"fields": fields})
+
+    def drain(self, max_items=None):
+        """
+        Pop up to max_items records, oldest first. Call from one thread only.
+        Returns a list of (timestamp, level, thread_name, msg).
+        """
+        records = []
+        while max_items is None or len(records) < max_items:
+            try:
+                records.append(self._records.popleft())
+            except IndexError:
+                break
+        return records
+
+    def pending(self):
+        return len(self._records)
+
+    def close(self):
+        """Stop the file writer thread after writing out queued records."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------------------
+# Stage duration histograms
+# ---------------------------
+# Upper bounds in seconds, from a cheap local step to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Fixed-bucket duration histogram (Prometheus style, not thread-safe on its own)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+# ---------------------------
+# Timing spans per click / chat
+# ---------------------------
+class SpanRecorder:
+    """
+    Thread-safe recorder of timed pipeline stages.
+
+    Every span has a stage name ("grab", "caption_llm", "retrieve", ...) and a
+    key naming the click or chat message it belongs to ("click-12", "chat-3").
+    Durations feed one histogram per stage; the last max_spans spans are kept
+    for export as a Chrome trace (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, max_spans=10000, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._spans = deque(maxlen=max_spans)
+        self._gauges = {}
+        self._lock = threading.Lock()
+        # Chrome trace timestamps are relative to this point
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage, key=None, **attrs):
+        """Time the body of a with-block as one span."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, key, start, time.perf_counter(), **attrs)
+
+    def record(self, stage, key, start, end, **attrs):
+        """Record a span from two time.perf_counter() readings."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(end - start)
+            self._spans.append((stage, key, start, end, threading.get_ident(), attrs))
+
+    def add_gauges(self, prefix, read):
+        """Export the numeric values of the dict returned by read() as <prefix>_<name> gauges."""
+        with self._lock:
+            self._gauges[prefix] = read
+
+    def summary(self):
+        """{stage: {count, mean, p50, p90, p99, max}} in seconds."""
+        with self._lock:
+            return {stage: h.summary() for stage, h in self._histograms.items()}
+
+    def spans_for(self, key):
+        """(stage, seconds) of the recorded spans of one click or chat."""
+        with self._lock:
+            return [(stage, end - start) for stage, k, start, end, _, _ in self._spans if k == key]
+
+    def chrome_trace(self):
+        """Recorded spans in the Chrome trace event format."""
+        with self._lock:
+            spans = list(self._spans)
+        events = []
+        for stage, key, start, end, thread_id, attrs in spans:
+            events.append({
+                "name": stage,
+                "cat": key.split("-")[0] if key else "app",
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 1,
+                "tid": thread_id,
+                "args": dict(attrs, key=key),
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def prometheus_text(self, metric="pipeline_stage_seconds"):
+        """Histograms in the Prometheus text exposition format."""
+        lines = [f"# HELP {metric} Duration of pipeline stages in seconds.",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+            gauges = list(self._gauges.items())
+        for prefix, read in gauges:
+            for name, value in read().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{name} gauge")
+                    lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+spans = SpanRecorder()
+
+
+# ---------------------------
+# Metrics HTTP endpoint
+# ---------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        recorder = self.server.recorder
+        if self.path == "/metrics":
+            data = recorder.prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/trace":
+            data = json.dumps(recorder.chrome_trace()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, recorder=spans, host="127.0.0.1"):
+    """
+    Serve /metrics (Prometheus text) and /trace (Chrome trace JSON) on a
+    background thread. Returns the server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.recorder = recorder
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,247 @@
+"""
+Headless replay of recorded clicks into the knowledge base.
+
+Captions archived before/after screenshot pairs (the game_screenshots layout
+written by the app: click_<N>_before_<YYYYmmdd_HHMMSS>.<png|webp|jpg> and the
+matching _after_ file) and writes the captions where the Pathway server
+indexes them. No window or Qt is needed, so a knowledge base can be rebuilt
+or backfilled from archives.
+
+Pairs are captioned in parallel on a thread or process pool, requests are
+paced to --rate per second, and finished pairs are recorded in a progress
+file so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m src.replay game_screenshots --workers 8 --rate 4
+    python -m src.replay archive/ --metadata clicks.jsonl --sink files --executor process
+
+Metadata (optional) is JSON Lines or a JSON list of objects with "id" (the N
+in the file names) and any of "x", "y" and "event_ts" (epoch seconds);
+"session" (the YYYYmmdd_HHMMSS part) tells apart repeated ids.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from src.agent.agent_utils import screenshot_to_text
+from src.file.create import save_text_to_file, CaptionLog
+
+load_dotenv()
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+LIVE_DIR = os.path.join(ROOT_DIR, "pathway", "data")
+API = os.getenv("GEMINI_API_KEY")
+
+PAIR_PATTERN = re.compile(r"^click_(\d+)_(before|after)_(\d{8}_\d{6})\.(png|webp|jpe?g)$", re.IGNORECASE)
+MIME_TYPES = {"png": "image/png", "webp": "image/webp", "jpg": "image/jpeg", "jpeg": "image/jpeg"}
+
+logger = logging.getLogger("replay")
+
+
+# ---------------------------
+# Finding recorded clicks
+# ---------------------------
+def find_pairs(screenshots_dir):
+    """
+    Return complete before/after pairs, oldest first, as dicts with
+    key, id, session, before, after and event_ts.
+    """
+    found = {}
+    for name in os.listdir(screenshots_dir):
+        match = PAIR_PATTERN.match(name)
+        if not match:
+            continue
+        click_id, side, session, _ = match.groups()
+        entry = found.setdefault((session, int(click_id)), {})
+        entry[side.lower()] = os.path.join(screenshots_dir, name)
+
+    pairs = []
+    for (session, click_id), files in sorted(found.items()):
+        if "before" not in files or "after" not in files:
+            continue
+        pairs.append({
+            "key": f"{session}/{click_id}",
+            "id": click_id,
+            "session": session,
+            "before": files["before"],
+            "after": files["after"],
+            "event_ts": datetime.strptime(session, "%Y%m%d_%H%M%S").timestamp(),
+        })
+    return pairs
+
+
+def load_metadata(path):
+    """Read click metadata (JSON list or JSON Lines) keyed by (session, id) and by id."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    records = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+    metadata = {}
+    for record in records:
+        metadata[(record.get("session"), int(record["id"]))] = record
+    return metadata
+
+
+def apply_metadata(pair, metadata):
+    record = metadata.get((pair["session"], pair["id"])) or metadata.get((None, pair["id"]))
+    if record:
+        if record.get("x") is not None and record.get("y") is not None:
+            pair["click"] = (record["x"], record["y"])
+        if record.get("event_ts") is not None:
+            pair["event_ts"] = float(record["event_ts"])
+    return pair
+
+
+# ---------------------------
+# Progress file
+# ---------------------------
+def load_progress(path):
+    """Keys of pairs already captioned by an earlier run."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    done.add(json.loads(line)["key"])
+    return done
+
+
+def record_progress(path, key, file_path):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"key": key, "file": file_path, "at": time.time()}) + "\n")
+
+
+# ---------------------------
+# Captioning
+# ---------------------------
+class RateLimiter:
+    """Paces calls to at most `rate` per second (0 disables). Thread-safe."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        time.sleep(max(0.0, at - now))
+
+
+def _read_image(path):
+    with open(path, "rb") as f:
+        return f.read(), MIME_TYPES[path.rsplit(".", 1)[1].lower()]
+
+
+def caption_pair(pair, api_key):
+    """Caption one before/after pair. Runs in the worker thread or process."""
+    images = [_read_image(pair["before"]), _read_image(pair["after"])]
+    return screenshot_to_text(images, api_key, event_time=datetime.fromtimestamp(pair["event_ts"]))
+
+
+def replay(pairs, sink, output_dir, progress_path, workers=4, executor="thread", rate=0.0,
+           api_key=API):
+    """
+    Caption pairs in parallel and write each caption as soon as it is ready.
+
+    Returns:
+        (captioned, failed) counts
+    """
+    caption_log = CaptionLog(output_dir, session_id=f"replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}") \
+        if sink == "jsonl" else None
+    limiter = RateLimiter(rate)
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    captioned = failed = 0
+    start = time.monotonic()
+
+    def _finish(future):
+        nonlocal captioned, failed
+        pair = in_flight.pop(future)
+        try:
+            caption = future.result()
+        except Exception as e:
+            failed += 1
+            logger.warning("Click %s failed: %s", pair["key"], e)
+            return
+        if caption_log is not None:
+            file_path = caption_log.append(caption, pair.get("click"), timestamp=pair["event_ts"])
+        else:
+            file_path = save_text_to_file(caption, output_dir)
+        record_progress(progress_path, pair["key"], file_path)
+        captioned += 1
+        if captioned % 10 == 0 or captioned + failed == len(pairs):
+            elapsed = time.monotonic() - start
+            logger.info("%d/%d captioned (%.2f pairs/s), %d failed",
+                        captioned, len(pairs), captioned / elapsed if elapsed else 0.0, failed)
+
+    in_flight = {}
+    with pool_cls(max_workers=workers) as pool:
+        for pair in pairs:
+            # Keep the pool busy without reading every image up front
+            while len(in_flight) >= workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _finish(future)
+            limiter.wait()
+            in_flight[pool.submit(caption_pair, pair, api_key)] = pair
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                _finish(future)
+    return captioned, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("screenshots_dir", help="directory with click_N_before/after_* screenshots")
+    parser.add_argument("--metadata", help="optional click metadata (JSON or JSON Lines)")
+    parser.add_argument("--output-dir", default=LIVE_DIR, help="where captions are written (default: pathway/data)")
+    parser.add_argument("--sink", choices=("jsonl", "files"), default=os.getenv("CAPTION_SINK", "jsonl"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread")
+    parser.add_argument("--rate", type=float, default=0.0, help="caption requests per second (0 = unlimited)")
+    parser.add_argument("--progress", help="progress file (default: <screenshots_dir>/.replay_progress.jsonl)")
+    parser.add_argument("--restart", action="store_true", help="ignore earlier progress")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    if not API:
+        logger.error("GEMINI_API_KEY is not set.")
+        return 1
+
+    progress_path = args.progress or os.path.join(args.screenshots_dir, ".replay_progress.jsonl")
+    if args.restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    done = load_progress(progress_path)
+
+    pairs = find_pairs(args.screenshots_dir)
+    metadata = load_metadata(args.metadata) if args.metadata else {}
+    todo = [apply_metadata(pair, metadata) for pair in pairs if pair["key"] not in done]
+    logger.info("Found %d click pairs, %d already done, %d to caption.", len(pairs), len(pairs) - len(todo), len(todo))
+    if not todo:
+        return 0
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    captioned, failed = replay(todo, args.sink, args.output_dir, progress_path,
+                               workers=args.workers, executor=args.executor, rate=args.rate)
+    logger.info("Done: %d captioned, %d failed%s.", captioned, failed,
+                " (run again to retry them)" if failed else "")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())